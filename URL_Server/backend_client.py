@@ -0,0 +1,157 @@
+"""HTTP client for the RAG backend, with deadlines, retries and a circuit breaker"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Worst case of a question on the backend before it sends anything: waiting
+# for an admission slot (AdmissionController.wait_timeout), then for the
+# current page to be indexed (Chat.ingest_wait), then retrieval and generation
+BACKEND_ADMISSION_WAIT = 120
+BACKEND_INGEST_WAIT = 120
+GENERATION_ALLOWANCE = 120
+# A slow answer under load must not count as a failure and open the circuit
+GENERATE_READ_TIMEOUT = BACKEND_ADMISSION_WAIT + BACKEND_INGEST_WAIT + GENERATION_ALLOWANCE
+
+class BackendUnavailable(Exception):
+    """Raised without calling the backend while the circuit breaker is open"""
+
+class BackendClient:
+    """
+    HTTP client for the RAG backend
+    
+    Keeps a pool of keep-alive connections, puts connect and read deadlines
+    on every call and retries only idempotent calls, with jittered
+    exponential backoff. After `failure_threshold` consecutive failures the
+    circuit opens and calls fail fast with BackendUnavailable for
+    `reset_timeout` seconds; the next call then probes the backend again.
+    
+    Args:
+        base_url (str): Backend address
+        connect_timeout (float): Seconds to establish a connection
+        read_timeout (float): Seconds to wait for each response read; the
+            default outlasts the backend's worst case for a question
+        retries (int): Extra attempts for idempotent calls
+        backoff (float): Base delay in seconds between retries
+        failure_threshold (int): Consecutive failures that open the circuit
+        reset_timeout (float): Seconds the circuit stays open
+    """
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=GENERATE_READ_TIMEOUT, retries=2,
+                 backoff=0.5, failure_threshold=3, reset_timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.latencies = {}
+        self.errors = {}
+
+    def available(self):
+        """Return False while the circuit is open"""
+        with self.lock:
+            return self.opened_at is None or time.time() - self.opened_at >= self.reset_timeout
+
+    def _record(self, path, started, ok):
+        elapsed = time.time() - started
+        with self.lock:
+            self.latencies.setdefault(path, deque(maxlen=200)).append(elapsed)
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.errors[path] = self.errors.get(path, 0) + 1
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    if self.opened_at is None:
+                        logging.error(f"Backend circuit opened after {self.failures} failures")
+                    self.opened_at = time.time()
+        logging.info(f"Backend {path}: {elapsed * 1000:.0f} ms{'' if ok else ' (failed)'}")
+
+    def request(self, method, path, idempotent=False, read_timeout=None, **kwargs):
+        """
+        Send a request and return the response
+        
+        Args:
+            method (str): HTTP method
+            path (str): Endpoint path on the backend
+            idempotent (bool): Whether the call may be retried
+            read_timeout (float, optional): Overrides the default read deadline
+            
+        Raises:
+            BackendUnavailable: If the circuit is open
+            requests.RequestException: If the call fails after all attempts
+        """
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            if not self.available():
+                raise BackendUnavailable(f"Backend circuit open, not calling {path}")
+            started = time.time()
+            try:
+                response = self.session.request(
+                    method,
+                    f'{self.base_url}{path}',
+                    timeout=(self.connect_timeout, read_timeout or self.read_timeout),
+                    **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(path, started, False)
+                if attempt + 1 == attempts:
+                    raise
+            else:
+                # A busy (503) backend is up; only other server errors count as failures
+                failed = response.status_code >= 500 and response.status_code != 503
+                self._record(path, started, not failed)
+                if response.status_code < 500 or attempt + 1 == attempts:
+                    response.raise_for_status()
+                    return response
+                response.close()
+            # Full jitter keeps retries from many clients apart
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def generate(self, payload):
+        return self.request('POST', '/generate', json=payload).json()
+
+    def generate_stream(self, payload):
+        """Yield the answer text as the backend streams it"""
+        with self.request('POST', '/generate-stream', json=payload, stream=True) as response:
+            response.encoding = response.encoding or 'utf-8'
+            for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                if chunk:
+                    yield chunk
+
+    def ingest(self, payload):
+        return self.request('POST', '/ingest', json=payload, read_timeout=10).json()
+
+    def ingest_status(self, namespace):
+        return self.request('GET', '/ingest-status', idempotent=True, read_timeout=5,
+                            params={'namespace': namespace}).json()
+
+    def stats(self):
+        """Per-endpoint call counts, errors and latency percentiles in milliseconds"""
+        with self.lock:
+            circuit_open = self.opened_at is not None and time.time() - self.opened_at < self.reset_timeout
+            stats = {'circuit_open': circuit_open, 'endpoints': {}}
+            for path, latencies in self.latencies.items():
+                ordered = sorted(latencies)
+                stats['endpoints'][path] = {
+                    'calls': len(ordered),
+                    'errors': self.errors.get(path, 0),
+                    'p50_ms': round(ordered[len(ordered) // 2] * 1000),
+                    'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000)
+                }
+        return stats
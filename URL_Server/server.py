@@ -6,10 +6,19 @@ import pygame
 import tempfile
 from gtts import gTTS
 import os
-import requests
 import time
+import uuid
+import hashlib
+import io
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+import queue
+import random
+import re
 import logging
 
+from backend_client import BackendClient, BackendUnavailable
+
 
 
 # Configure logging
@@ -34,13 +43,142 @@ CORS(app, resources={
     }
 })
 
+# Index namespace on the RAG backend, so concurrent users don't share an index
+SESSION_ID = os.environ.get('VISTA_SESSION_ID', uuid.uuid4().hex)
+
 # Global variables for storing browser data
 browser_data = {
     'current_url': '',
     'urls': [],
-    'token': '0'
+    'link_set': ''
 }
 
+# Links the backend scrapes up front per page
+CRAWL_BUDGET = int(os.environ.get('VISTA_CRAWL_BUDGET', '20'))
+
+# Seconds without a new report before a link set is sent for indexing
+DEBOUNCE_SECONDS = 1.0
+debounce_lock = threading.Lock()
+debounce_timer = None
+# Link set last sent to the backend for indexing
+indexed_links = {'link_set': '', 'urls': set()}
+
+def normalize_url(url):
+    """Canonical form of a URL: no fragment, lowercase scheme and host, no default port or trailing slash"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != {'http': 80, 'https': 443}.get(scheme):
+        host = f'{host}:{parts.port}'
+    path = parts.path.rstrip('/') if parts.path not in ('', '/') else ''
+    return urlunsplit((scheme, host, path, parts.query, ''))
+
+def link_set_hash(urls, current_url=''):
+    """Order-insensitive hash of a normalized link set; must match rag/lib/links.py"""
+    links = {normalize_url(url) for url in urls if url}
+    if current_url:
+        links.add(normalize_url(current_url))
+    return hashlib.sha256('\n'.join(sorted(links)).encode('utf-8')).hexdigest()
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech
+    
+    Audio is keyed by (text, voice, speed) and kept in a size-bounded LRU in
+    memory, backed by one file per phrase on disk so canned phrases survive
+    restarts and play without a network round trip.
+    
+    Args:
+        path (str): Directory of the disk tier
+        max_memory_bytes (int): Audio bytes kept in memory
+        max_disk_bytes (int): Audio bytes kept on disk; least recently used files are removed
+    """
+    def __init__(self, path='tts_cache', max_memory_bytes=16 * 2**20, max_disk_bytes=256 * 2**20):
+        self.path = path
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(text, voice, speed):
+        return hashlib.sha256(f'{voice}\0{speed}\0{text}'.encode('utf-8')).hexdigest()
+
+    def _remember(self, key, audio):
+        # Caller holds the lock
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = audio
+        self.memory_bytes += len(audio)
+        while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def get(self, key):
+        """Return cached audio bytes for `key`, or None"""
+        with self.lock:
+            audio = self.memory.get(key)
+            if audio is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return audio
+        filename = os.path.join(self.path, f'{key}.mp3')
+        try:
+            with open(filename, 'rb') as f:
+                audio = f.read()
+            os.utime(filename)  # Marks the file recently used for disk eviction
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key, audio):
+        """Store audio bytes in memory and on disk"""
+        with self.lock:
+            self._remember(key, audio)
+        filename = os.path.join(self.path, f'{key}.mp3')
+        temp_filename = f'{filename}.{uuid.uuid4().hex}.tmp'
+        with open(temp_filename, 'wb') as f:
+            f.write(audio)
+        os.replace(temp_filename, filename)
+        self._trim_disk()
+
+    def _trim_disk(self):
+        files = []
+        for name in os.listdir(self.path):
+            if name.endswith('.mp3'):
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_entries': len(self.memory),
+                'memory_bytes': self.memory_bytes
+            }
+
 class VoiceAssistant:
     def __init__(self):
         self.recognizer = sr.Recognizer()
@@ -58,8 +196,109 @@ class VoiceAssistant:
         # Initialize audio playback
         pygame.mixer.init()
         self.temp_dir = tempfile.mkdtemp()
+        # Serializes playback between the waiting messages and the answer
+        self.audio_lock = threading.Lock()
+        # gTTS voice settings; part of the audio cache key
+        self.voice = 'en'
+        self.slow = False
+        self.tts_cache = TTSCache()
         logging.info("Voice Assistant initialized")
 
+    def synthesize(self, text, filename=None):
+        """
+        Convert text to an mp3 file without playing it
+        
+        Args:
+            text (str): Text to convert to speech
+            filename (str, optional): Output filename; a temporary file is created if omitted
+            
+        Returns:
+            str: Path of the generated audio file
+        """
+        if filename is None:
+            temp_fd, filename = tempfile.mkstemp(suffix='.mp3', dir=self.temp_dir)
+            os.close(temp_fd)  # Close file descriptor
+        
+        # Create TTS file, calling gTTS only for text not heard before
+        audio = self.synthesize_bytes(text)
+        with open(filename, 'wb') as f:
+            f.write(audio)
+        
+        # Verify file exists before attempting playback
+        if not os.path.exists(filename):
+            raise FileNotFoundError(f"Generated audio file not found: {filename}")
+        return filename
+
+    def synthesize_bytes(self, text):
+        """
+        Return mp3 audio for text, from the TTS cache when possible
+        
+        Args:
+            text (str): Text to convert to speech
+            
+        Returns:
+            bytes: The encoded audio
+        """
+        key = TTSCache.key(text, self.voice, 'slow' if self.slow else 'normal')
+        audio = self.tts_cache.get(key)
+        if audio is None:
+            buffer = io.BytesIO()
+            gTTS(text=text, lang=self.voice, slow=self.slow).write_to_fp(buffer)
+            audio = buffer.getvalue()
+            self.tts_cache.put(key, audio)
+        return audio
+
+    def presynthesize(self, phrases):
+        """
+        Fill the TTS cache with fixed phrases so they play instantly and offline
+        
+        Args:
+            phrases (list): Phrases to synthesize
+        """
+        start_time = time.time()
+        for phrase in phrases:
+            try:
+                self.synthesize_bytes(phrase)
+            except Exception as e:
+                logging.error(f"Error pre-synthesizing '{phrase}': {str(e)}")
+        logging.info(f"Pre-synthesized {len(phrases)} phrases in {time.time() - start_time:.2f}s, "
+                     f"TTS cache: {self.tts_cache.stats()}")
+
+    def play(self, filename, remove=False):
+        """
+        Play an audio file at 1.3x speed, one file at a time
+        
+        Args:
+            filename (str): Audio file to play
+            remove (bool): Delete the file after playback
+        """
+        try:
+            with self.audio_lock:
+                # Initialize pygame mixer with higher frequency for faster playback
+                pygame.mixer.quit()
+                pygame.mixer.init(frequency=114530)  # 88100 * 1.3 for 30% faster playback
+                
+                # Load and configure audio
+                sound = pygame.mixer.Sound(filename)
+                channel = sound.play()
+                
+                if channel:
+                    # Set additional playback properties for speed
+                    channel.set_volume(1.0)  # Maintain clear volume
+                    
+                    # More efficient playback loop
+                    clock = pygame.time.Clock()
+                    while channel.get_busy():
+                        clock.tick(60)  # Higher tick rate for smoother playback
+                        pygame.time.wait(1)  # Small wait to reduce CPU usage
+                
+                # Cleanup
+                pygame.mixer.quit()
+                pygame.mixer.init()  # Reset to default settings
+        finally:
+            if remove and os.path.exists(filename):
+                os.remove(filename)
+
     def text_to_speech(self, text, filename=None):
         """
         Convert text to speech and play it at 1.3x speed
@@ -73,46 +312,11 @@ class VoiceAssistant:
         """
         temp_file = None
         try:
-            # Create a temporary file if filename not provided
-            if filename is None:
-                import tempfile
-                temp_fd, temp_file = tempfile.mkstemp(suffix='.mp3', dir=self.temp_dir)
-                os.close(temp_fd)  # Close file descriptor
-                filename = temp_file
-            
-            # Create TTS file
-            tts = gTTS(text=text, lang='en', slow=False)
-            tts.save(filename)
-            
-            # Verify file exists before attempting playback
-            if not os.path.exists(filename):
-                raise FileNotFoundError(f"Generated audio file not found: {filename}")
-            
-            # Initialize pygame mixer with higher frequency for faster playback
-            pygame.mixer.quit()
-            pygame.mixer.init(frequency=114530)  # 88100 * 1.3 for 30% faster playback
-            
-            # Load and configure audio
-            sound = pygame.mixer.Sound(filename)
-            channel = sound.play()
-            
-            if channel:
-                # Set additional playback properties for speed
-                channel.set_volume(1.0)  # Maintain clear volume
-                
-                # More efficient playback loop
-                clock = pygame.time.Clock()
-                while channel.get_busy():
-                    clock.tick(60)  # Higher tick rate for smoother playback
-                    pygame.time.wait(1)  # Small wait to reduce CPU usage
-            
-            # Cleanup
-            pygame.mixer.quit()
-            pygame.mixer.init()  # Reset to default settings
-            
+            path = self.synthesize(text, filename)
             # Only delete the file if it was a temporary file we created
-            if temp_file and os.path.exists(temp_file):
-                os.remove(temp_file)
+            if filename is None:
+                temp_file = path
+            self.play(path, remove=temp_file is not None)
             
         except Exception as e:
             logging.error(f"Error in text to speech: {str(e)}")
@@ -126,7 +330,7 @@ class VoiceAssistant:
 
     def play_acknowledgment(self):
         """Play a short acknowledgment sound"""
-        self.text_to_speech("Hi! How can I help you today?", os.path.join(self.temp_dir, 'ack.mp3'))
+        self.text_to_speech(ACKNOWLEDGMENT_MESSAGE, os.path.join(self.temp_dir, 'ack.mp3'))
 
     def speech_to_text(self, timeout=None, phrase_time_limit=None):
         """Listen for speech and convert to text"""
@@ -166,6 +370,172 @@ class VoiceAssistant:
             return any(wake_word in text.lower() for wake_word in self.wake_words)
         return False
 
+# List of varied waiting messages
+WAITING_MESSAGES = [
+    "almost there",
+    "still processing",
+    "gathering information",
+    "analyzing the data",
+    "just a moment longer",
+    "retrieving your results",
+    "working on it",
+    "processing your request",
+    "nearly done",
+    "getting there",
+    "hold on a moment",
+    "collecting the information",
+    "compiling the results",
+    "please wait a bit longer"
+]
+
+BACKEND_URL = os.environ.get('VISTA_BACKEND_URL', 'http://195.242.13.147:50001')
+
+# Spoken when the backend cannot be reached
+BACKEND_UNAVAILABLE_MESSAGE = "Sorry, I can't reach the server right now. Please try again in a moment."
+
+ACKNOWLEDGMENT_MESSAGE = "Hi! How can I help you today?"
+PATIENCE_MESSAGE = "Retrieving Data. Please be patient"
+DONE_MESSAGE = "Done. Please let me know if you have more questions."
+NO_PAGE_MESSAGE = "No page data available. Please wait for a page to load."
+
+# Synthesized at startup so canned prompts never wait on gTTS
+FIXED_PHRASES = [
+    ACKNOWLEDGMENT_MESSAGE,
+    PATIENCE_MESSAGE,
+    DONE_MESSAGE,
+    NO_PAGE_MESSAGE,
+    BACKEND_UNAVAILABLE_MESSAGE
+] + WAITING_MESSAGES
+
+backend = BackendClient(BACKEND_URL)
+
+# Sentence boundaries used to hand streamed text to TTS
+SENTENCE_END = re.compile(r'(?<=[.?!])\s+')
+
+def build_payload(command):
+    """Build and log the request body for a backend call"""
+    payload = {
+        'link_set': browser_data['link_set'],
+        'command': command,
+        'urls': browser_data['urls'],
+        'current_url': browser_data['current_url'],
+        'namespace': SESSION_ID,
+        'crawl_budget': CRAWL_BUDGET
+    }
+    
+    logging.info("\n" + "="*50)
+    logging.info("DATA SENT TO BACKEND:")
+    logging.info("="*50)
+    logging.info(f"COMMAND: {command}")
+    logging.info(f"LINK SET: {browser_data['link_set'][:16]}")
+    logging.info(f"NAMESPACE: {SESSION_ID}")
+    logging.info(f"CURRENT URL: {browser_data['current_url']}")
+    logging.info("\nALL URLS:")
+    for idx, url in enumerate(browser_data['urls'], 1):
+        logging.info(f"{idx}. {url}")
+    logging.info("="*50)
+    return payload
+
+def start_backend_ingest(data):
+    """
+    Ask the backend to index a page's links in the background
+    
+    Runs in its own thread so the extension's request returns immediately,
+    and indexing overlaps with the wake word and command capture.
+    
+    Args:
+        data (dict): Browser data reported by the extension
+    """
+    def post_ingest():
+        try:
+            status = backend.ingest({
+                'urls': data['urls'],
+                'current_url': data['current_url'],
+                'link_set': data['link_set'],
+                'namespace': SESSION_ID,
+                'crawl_budget': CRAWL_BUDGET
+            })
+            logging.info(f"Backend ingest started: {status}")
+        except Exception as e:
+            logging.error(f"Error starting backend ingest: {str(e)}")
+    
+    if data['urls']:
+        threading.Thread(target=post_ingest, daemon=True).start()
+
+def schedule_ingest():
+    """
+    Send the latest link set for indexing once reports have settled
+    
+    SPA navigations and re-renders post the same page many times in a row;
+    only the last report within DEBOUNCE_SECONDS is sent, and only if its
+    link set differs from the one already indexed.
+    """
+    global debounce_timer
+    
+    def flush():
+        data = browser_data
+        with debounce_lock:
+            if data['link_set'] == indexed_links['link_set']:
+                logging.info("Link set unchanged, nothing to index")
+                return
+            urls = set(data['urls'])
+            added = len(urls - indexed_links['urls'])
+            removed = len(indexed_links['urls'] - urls)
+            indexed_links['link_set'] = data['link_set']
+            indexed_links['urls'] = urls
+        logging.info(f"Link set {data['link_set'][:16]}: {added} links added, {removed} removed")
+        start_backend_ingest(data)
+    
+    with debounce_lock:
+        if debounce_timer is not None:
+            debounce_timer.cancel()
+        debounce_timer = threading.Timer(DEBOUNCE_SECONDS, flush)
+        debounce_timer.daemon = True
+        debounce_timer.start()
+
+def current_page_indexed():
+    """Return True if the backend reports the current page as queryable"""
+    try:
+        status = backend.ingest_status(SESSION_ID)
+        return status.get('current_ready', False) and status.get('current_url') == browser_data['current_url']
+    except Exception as e:
+        logging.error(f"Error checking ingest status: {str(e)}")
+        return False
+
+def start_waiting_messages(voice_assistant):
+    """
+    Speak randomized waiting messages until the returned event is set
+    
+    Args:
+        voice_assistant: Voice assistant instance for audio feedback
+        
+    Returns:
+        threading.Event: Set it to stop the waiting messages
+    """
+    # Create a daemon thread for the randomized waiting messages
+    waiting_event = threading.Event()
+    
+    def say_waiting_message():
+        used_messages = set()  # Track used messages to avoid immediate repetition
+        while not waiting_event.is_set():
+            # If we've used all messages, reset the used messages set
+            if len(used_messages) == len(WAITING_MESSAGES):
+                used_messages.clear()
+            
+            # Get available messages (ones we haven't used recently)
+            available_messages = [msg for msg in WAITING_MESSAGES if msg not in used_messages]
+            
+            # Select and speak a random message
+            message = random.choice(available_messages)
+            used_messages.add(message)
+            voice_assistant.text_to_speech(message)
+            waiting_event.wait(8)
+    
+    if voice_assistant:
+        waiting_thread = threading.Thread(target=say_waiting_message, daemon=True)
+        waiting_thread.start()
+    return waiting_event
+
 def send_command_to_backend(command, voice_assistant=None):
     """
     Send command to backend and wait for response
@@ -177,101 +547,170 @@ def send_command_to_backend(command, voice_assistant=None):
     Returns:
         str: Response from backend or error message
     """
+    waiting_event = threading.Event()
     try:
-        import random
+        payload = build_payload(command)
+        waiting_event = start_waiting_messages(voice_assistant)
         
-        # List of varied waiting messages
-        waiting_messages = [
-            "almost there",
-            "still processing",
-            "gathering information",
-            "analyzing the data",
-            "just a moment longer",
-            "retrieving your results",
-            "working on it",
-            "processing your request",
-            "nearly done",
-            "getting there",
-            "hold on a moment",
-            "collecting the information",
-            "compiling the results",
-            "please wait a bit longer"
-        ]
+        # Send request to backend
+        response_data = backend.generate(payload)
         
-        payload = {
-            'token': browser_data['token'],
-            'command': command,
-            'urls': browser_data['urls']
-        }
+        # Stop the waiting messages
+        waiting_event.set()
         
         logging.info("\n" + "="*50)
-        logging.info("DATA SENT TO BACKEND:")
-        logging.info("="*50)
-        logging.info(f"COMMAND: {command}")
-        logging.info(f"TOKEN: '{browser_data['token']}'")
-        logging.info(f"CURRENT URL: {browser_data['current_url']}")
-        logging.info("\nALL URLS:")
-        for idx, url in enumerate(browser_data['urls'], 1):
-            logging.info(f"{idx}. {url}")
+        logging.info("BACKEND RESPONSE:")
         logging.info("="*50)
+        logging.info(response_data.get('response', 'Response not received'))
+        logging.info("="*50 + "\n")
+        print(response_data)
         
-        # Create a daemon thread for the randomized waiting messages
-        waiting_event = threading.Event()
+        return response_data.get('response', 'Response not received')
+            
+    except BackendUnavailable:
+        waiting_event.set()
+        return BACKEND_UNAVAILABLE_MESSAGE
+    except Exception as e:
+        waiting_event.set()  # Make sure to stop the waiting messages on error
+        logging.error(f"Error sending command to backend: {str(e)}")
+        return "Response not received"
+
+def stream_command_to_backend(command):
+    """
+    Send command to the streaming endpoint and yield the answer as it is generated
+    
+    Args:
+        command (str): Command to send to backend
         
-        def say_waiting_message():
-            used_messages = set()  # Track used messages to avoid immediate repetition
-            while not waiting_event.is_set():
-                # If we've used all messages, reset the used messages set
-                if len(used_messages) == len(waiting_messages):
-                    used_messages.clear()
-                
-                # Get available messages (ones we haven't used recently)
-                available_messages = [msg for msg in waiting_messages if msg not in used_messages]
-                
-                # Select and speak a random message
-                message = random.choice(available_messages)
-                used_messages.add(message)
-                voice_assistant.text_to_speech(message)
-                time.sleep(8)
+    Yields:
+        str: Chunks of the answer text
+    """
+    yield from backend.generate_stream(build_payload(command))
+
+def split_sentences(chunks):
+    """
+    Regroup streamed text chunks into complete sentences
+    
+    Args:
+        chunks: Iterable of text chunks
         
-        if voice_assistant:
-            waiting_thread = threading.Thread(target=say_waiting_message, daemon=True)
-            waiting_thread.start()
+    Yields:
+        str: Each sentence as soon as its end has arrived
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        parts = SENTENCE_END.split(buffer)
+        for sentence in parts[:-1]:
+            if sentence.strip():
+                yield sentence.strip()
+        buffer = parts[-1]
+    if buffer.strip():
+        yield buffer.strip()
+
+def speak_streamed_response(command, voice_assistant):
+    """
+    Speak the backend's answer sentence by sentence while it is still being generated
+    
+    The next sentence is synthesized while the current one plays, so the
+    first sentence is heard long before the full answer exists.
+    
+    Args:
+        command (str): Command to send to backend
+        voice_assistant: Voice assistant instance used for synthesis and playback
         
-        # Send request to backend
-        response = requests.post(
-            'http://195.242.13.147:50001/generate',
-            json=payload
-        )
+    Returns:
+        str: The full answer that was spoken
+    """
+    start_time = time.time()
+    waiting_event = start_waiting_messages(voice_assistant)
+    sentences = []
+    audio_files = queue.Queue(maxsize=2)
+    # Set when playback ends early, so the producer stops and closes the stream
+    stop = threading.Event()
+    
+    def put(item):
+        while not stop.is_set():
+            try:
+                audio_files.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        if isinstance(item, str) and os.path.exists(item):
+            os.remove(item)
+    
+    def synthesize_sentences():
+        stream = stream_command_to_backend(command)
         
-        # Stop the waiting messages
-        if voice_assistant:
-            waiting_event.set()
+        def chunks():
+            for chunk in stream:
+                if stop.is_set():
+                    return
+                yield chunk
         
-        if response.ok:
-            response_data = response.json()
-            logging.info("\n" + "="*50)
-            logging.info("BACKEND RESPONSE:")
-            logging.info("="*50)
-            logging.info(response_data.get('response', 'Response not received'))
-            logging.info("="*50 + "\n")
-            print(response_data)
-            
-            # Set token to '1' after successful request
-            browser_data['token'] = '1'
-            
-            return response_data.get('response', 'Response not received')
-        return "Response not received"
-            
-    except Exception as e:
-        if voice_assistant:
-            waiting_event.set()  # Make sure to stop the waiting messages on error
-        logging.error(f"Error sending command to backend: {str(e)}")
-        return "Response not received"
+        try:
+            for sentence in split_sentences(chunks()):
+                if stop.is_set():
+                    break
+                sentences.append(sentence)
+                put(voice_assistant.synthesize(sentence))
+        except Exception as e:
+            put(e)
+        finally:
+            # Closing the generator closes the HTTP response
+            stream.close()
+            put(None)
+    
+    threading.Thread(target=synthesize_sentences, daemon=True).start()
+    
+    try:
+        spoken = False
+        while True:
+            item = audio_files.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                # Nothing spoken yet: let the caller fall back to a plain request
+                if not spoken:
+                    raise item
+                logging.error(f"Answer stream interrupted: {str(item)}")
+                break
+            if not spoken:
+                waiting_event.set()
+                logging.info(f"Time to first audio: {time.time() - start_time:.2f}s")
+            try:
+                voice_assistant.play(item, remove=True)
+            except Exception as e:
+                # Replaying the answer from the start would repeat what was heard
+                if not spoken:
+                    raise
+                logging.error(f"Playback interrupted: {str(e)}")
+                break
+            spoken = True
+    finally:
+        waiting_event.set()
+        stop.set()
+        # Remove audio synthesized but never played
+        while True:
+            try:
+                item = audio_files.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, str) and os.path.exists(item):
+                os.remove(item)
+    
+    response = " ".join(sentences)
+    logging.info("\n" + "="*50)
+    logging.info("BACKEND RESPONSE:")
+    logging.info("="*50)
+    logging.info(response)
+    logging.info("="*50 + "\n")
+    return response
 
 def run_voice_assistant():
     """Main function to run the voice assistant"""
     assistant = VoiceAssistant()
+    threading.Thread(target=assistant.presynthesize, args=(FIXED_PHRASES,), daemon=True).start()
     
     while True:
         try:
@@ -285,19 +724,31 @@ def run_voice_assistant():
                 logging.info("Listening for command...")
                 command = assistant.speech_to_text(timeout=None, phrase_time_limit=10.0)
 
-                if browser_data['token'] == '0':
-                    logging.info("Retrieving Data. Please be patient")
-                    assistant.text_to_speech("Retrieving Data. Please be patient")
+                if command and not backend.available():
+                    logging.info("Backend unavailable, skipping command")
+                    assistant.text_to_speech(BACKEND_UNAVAILABLE_MESSAGE)
+                    continue
+
+                if not current_page_indexed():
+                    logging.info(PATIENCE_MESSAGE)
+                    assistant.text_to_speech(PATIENCE_MESSAGE)
                 
                 if command:
                     logging.info(f"Command received: {command}")
                     
                     if browser_data['urls']:
-                        backend_response = send_command_to_backend(command, voice_assistant=assistant)
-                        assistant.text_to_speech(backend_response)
-                        assistant.text_to_speech("Done. Please let me know if you have more questions.")
+                        try:
+                            speak_streamed_response(command, assistant)
+                        except BackendUnavailable:
+                            assistant.text_to_speech(BACKEND_UNAVAILABLE_MESSAGE)
+                            continue
+                        except Exception as e:
+                            logging.error(f"Streaming response failed: {str(e)}")
+                            backend_response = send_command_to_backend(command, voice_assistant=assistant)
+                            assistant.text_to_speech(backend_response)
+                        assistant.text_to_speech(DONE_MESSAGE)
                     else:
-                        assistant.text_to_speech("No page data available. Please wait for a page to load.")
+                        assistant.text_to_speech(NO_PAGE_MESSAGE)
             
             time.sleep(0.1)
                 
@@ -318,21 +769,27 @@ def process_links():
         if not browser_update:
             raise ValueError("No JSON data received")
         
-        buffer = browser_update.get('token', '0')
+        current_url = browser_update.get('currentUrl', '')
+        urls = list(dict.fromkeys(
+            normalize_url(url) for url in browser_update.get('allUrls', []) if url
+        ))
         browser_data = {
-            'current_url': browser_update.get('currentUrl', ''),
-            'urls': browser_update.get('allUrls',  []),
-            'token': str(buffer)
+            'current_url': normalize_url(current_url) if current_url else '',
+            'urls': urls,
+            'link_set': link_set_hash(urls, current_url)
         }
         
         logging.info("\n" + "="*50)
         logging.info("Updated Browser Data:")
         logging.info("="*50)
         logging.info(f"Current URL: {browser_data['current_url']}")
-        logging.info(f"Token: '{browser_data['token']}'")
+        logging.info(f"Link set: {browser_data['link_set'][:16]}")
         logging.info(f"URLs found: {len(browser_data['urls'])}")
         logging.info("="*50 + "\n")
         
+        # Index the page while the user is still reading it
+        schedule_ingest()
+        
         return jsonify({'status': 'success', 'message': 'Links processed successfully'})
         
     except Exception as e:
@@ -346,7 +803,8 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'current_page': browser_data['current_url'],
-        'urls_collected': len(browser_data['urls'])
+        'urls_collected': len(browser_data['urls']),
+        'backend': backend.stats()
     })
 
 def start_server():
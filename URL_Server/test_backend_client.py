@@ -0,0 +1,131 @@
+"""Tests of BackendClient against a stub backend served with http.server"""
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from backend_client import (
+    BACKEND_ADMISSION_WAIT,
+    BACKEND_INGEST_WAIT,
+    GENERATE_READ_TIMEOUT,
+    BackendClient,
+    BackendUnavailable,
+)
+
+
+class StubBackend(ThreadingHTTPServer):
+    """
+    Answer each path with the next of its scripted (status, delay) responses
+
+    The last response of a path repeats once the script runs out.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.scripts = {}
+        self.calls = {}
+
+    def script(self, path, *responses):
+        self.scripts[path] = list(responses)
+
+    def respond(self, path):
+        self.calls[path] = self.calls.get(path, 0) + 1
+        responses = self.scripts.get(path, [(200, 0)])
+        return responses.pop(0) if len(responses) > 1 else responses[0]
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up before the stub answers
+        pass
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def _reply(self):
+        path = self.path.split('?')[0]
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        status, delay = self.server.respond(path)
+        time.sleep(delay)
+        body = json.dumps({'path': path, 'request': request}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class BackendClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubBackend()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        self.client = BackendClient(f'http://{host}:{port}', backoff=0, failure_threshold=3,
+                                    reset_timeout=0.5)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_generate_returns_the_backend_json(self):
+        response = self.client.generate({'command': 'hello'})
+        self.assertEqual(response['request'], {'command': 'hello'})
+
+    def test_idempotent_calls_are_retried(self):
+        self.server.script('/ingest-status', (500, 0), (200, 0))
+        self.assertEqual(self.client.ingest_status('ns')['path'], '/ingest-status')
+        self.assertEqual(self.server.calls['/ingest-status'], 2)
+
+    def test_generate_is_not_retried(self):
+        self.server.script('/generate', (500, 0), (200, 0))
+        with self.assertRaises(requests.HTTPError):
+            self.client.generate({'command': 'hello'})
+        self.assertEqual(self.server.calls['/generate'], 1)
+
+    def test_busy_backend_does_not_open_the_circuit(self):
+        self.server.script('/generate', (503, 0))
+        for _ in range(5):
+            with self.assertRaises(requests.HTTPError):
+                self.client.generate({'command': 'hello'})
+        self.assertTrue(self.client.available())
+
+    def test_circuit_opens_and_probes_again_after_the_reset_timeout(self):
+        self.server.script('/generate', (500, 0), (500, 0), (500, 0), (200, 0))
+        for _ in range(3):
+            with self.assertRaises(requests.HTTPError):
+                self.client.generate({'command': 'hello'})
+        with self.assertRaises(BackendUnavailable):
+            self.client.generate({'command': 'hello'})
+        self.assertEqual(self.server.calls['/generate'], 3)
+
+        time.sleep(0.6)
+        self.assertEqual(self.client.generate({'command': 'hello'})['path'], '/generate')
+        self.assertTrue(self.client.available())
+
+    def test_slow_answer_within_the_deadline_succeeds(self):
+        self.server.script('/generate', (200, 0.3))
+        client = BackendClient(self.client.base_url, read_timeout=1)
+        self.assertEqual(client.generate({'command': 'hello'})['path'], '/generate')
+        self.assertEqual(client.stats()['endpoints']['/generate']['errors'], 0)
+
+    def test_read_timeout_counts_as_a_failure(self):
+        self.server.script('/generate', (200, 0.5))
+        client = BackendClient(self.client.base_url, read_timeout=0.1)
+        with self.assertRaises(requests.Timeout):
+            client.generate({'command': 'hello'})
+        self.assertEqual(client.stats()['endpoints']['/generate']['errors'], 1)
+
+    def test_generate_deadline_outlasts_the_backend_waits(self):
+        self.assertGreater(GENERATE_READ_TIMEOUT, BACKEND_ADMISSION_WAIT + BACKEND_INGEST_WAIT)
+        self.assertEqual(self.client.read_timeout, GENERATE_READ_TIMEOUT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+"""Tests of regrouping a streamed answer into sentences for TTS"""
+import re
+import unittest
+
+from server import split_sentences
+
+ANSWER = "The basic plan costs $10.50 a month. Does it include support? Yes! Email support only"
+
+
+def fake_stream(text):
+    """Yield text in word and whitespace pieces, as a streaming model does"""
+    yield from re.findall(r'\s+|\S+', text)
+
+
+class SplitSentencesTest(unittest.TestCase):
+    def test_sentences_are_regrouped_from_token_chunks(self):
+        self.assertEqual(list(split_sentences(fake_stream(ANSWER))), [
+            "The basic plan costs $10.50 a month.",
+            "Does it include support?",
+            "Yes!",
+            "Email support only",
+        ])
+
+    def test_sentence_is_yielded_before_the_stream_ends(self):
+        def stream():
+            yield "First sentence. "
+            yield "Second"
+            raise AssertionError("read past the first sentence")
+
+        self.assertEqual(next(split_sentences(stream())), "First sentence.")
+
+    def test_empty_stream_yields_nothing(self):
+        self.assertEqual(list(split_sentences(iter(["", "  "]))), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
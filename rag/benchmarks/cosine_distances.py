@@ -0,0 +1,53 @@
+"""Micro-benchmark for `calculate_cosine_distances`.
+
+Compares the batched NumPy path with the previous per-pair
+`cosine_similarity` loop. Run from the `rag` directory:
+
+    python -m benchmarks.cosine_distances --sentences 10000
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_community.utils.math import cosine_similarity
+
+from lib.text_splitter import calculate_cosine_distances
+
+
+def pairwise_loop(embeddings):
+    """The original implementation: one `cosine_similarity` call per pair."""
+    distances = []
+    for i in range(len(embeddings) - 1):
+        similarity = cosine_similarity([embeddings[i]], [embeddings[i + 1]])[0][0]
+        distances.append(1 - similarity)
+    return distances
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sentences", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Embedding models hand back lists of floats.
+    embeddings = rng.standard_normal((args.sentences, args.dim)).tolist()
+
+    loop_time, expected = best_of(lambda: pairwise_loop(embeddings), args.repeat)
+    batch_time, actual = best_of(lambda: calculate_cosine_distances(embeddings), args.repeat)
+
+    assert np.allclose(expected, actual, atol=1e-4)
+    print(f"{args.sentences} sentences x {args.dim} dims")
+    print(f"per-pair loop: {loop_time * 1000:9.1f} ms")
+    print(f"batched numpy: {batch_time * 1000:9.1f} ms")
+    print(f"speedup:       {loop_time / batch_time:9.1f}x")
@@ -0,0 +1,68 @@
+"""Concurrent load generator for the RAG backend.
+
+Fires `--requests` POSTs at /generate from `--concurrency` threads and
+reports throughput, latency percentiles and status codes (503 means the
+admission queue turned the request away). The first request of each
+namespace indexes the link set; later ones find it indexed. Run from the
+`rag` directory:
+
+    python -m benchmarks.load_generator --url http://localhost:50001 \
+        --concurrency 8 --requests 64 --urls-file links.txt
+"""
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+QUESTIONS = [
+    "What is this page about?",
+    "Where is the contact information?",
+    "What products are listed?",
+    "Summarize the main section.",
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:50001")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--urls-file", required=True, help="Link set, one URL per line.")
+    parser.add_argument("--namespaces", type=int, default=1,
+                        help="Spread requests over this many sessions.")
+    args = parser.parse_args()
+
+    with open(args.urls_file, encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip()]
+
+    session = requests.Session()
+
+    def send(i):
+        payload = {
+            "command": QUESTIONS[i % len(QUESTIONS)],
+            "urls": urls,
+            "current_url": urls[0],
+            "namespace": f"load-{i % args.namespaces}",
+        }
+        start = time.perf_counter()
+        try:
+            status = session.post(f"{args.url}/generate", json=payload, timeout=600).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(send, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    ok = [latency for status, latency in results if status == 200]
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {elapsed:.1f}s")
+    print(f"throughput: {len(ok) / elapsed:.2f} successful requests/s")
+    if ok:
+        print(f"latency p50 {np.percentile(ok, 50):.2f}s, p95 {np.percentile(ok, 95):.2f}s")
+    print(f"status codes: {dict(Counter(status for status, _ in results))}")
+    print(f"server stats: {session.get(f'{args.url}/stats', timeout=10).json()}")
@@ -0,0 +1,64 @@
+"""Latency/recall comparison of the retrieval strategies.
+
+Runs every question through each strategy against an existing collection
+and reports latency percentiles and recall. Recall is the share of the
+chunks found by ``multi`` (the most thorough strategy) that a strategy
+also returns. Run from the `rag` directory with Ollama up:
+
+    python -m benchmarks.retrieval_strategies --collection vista-... questions.txt
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+
+from lib.retrieval import Retriever
+
+STRATEGIES = ["single", "fast", "multi"]
+
+
+def chunk_keys(docs):
+    return {(doc.page_content, doc.metadata.get("source")) for doc in docs}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help="File with one question per line.")
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--persist-directory", default="vectordb")
+    parser.add_argument("--model", default="llama3.2:3b")
+    parser.add_argument("--deadline", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    vectordb = Chroma(
+        collection_name=args.collection,
+        persist_directory=args.persist_directory,
+        embedding_function=OllamaEmbeddings(model=args.model),
+    )
+    retriever = Retriever(ChatOllama(model=args.model), deadline=args.deadline)
+
+    latencies = {strategy: [] for strategy in STRATEGIES}
+    results = {strategy: [] for strategy in STRATEGIES}
+    for question in questions:
+        for strategy in STRATEGIES:
+            start = time.perf_counter()
+            docs = retriever.retrieve(vectordb, question, strategy=strategy)
+            latencies[strategy].append(time.perf_counter() - start)
+            results[strategy].append(chunk_keys(docs))
+
+    print(f"{len(questions)} questions")
+    print(f"{'strategy':<8} {'p50 (s)':>8} {'p95 (s)':>8} {'recall':>7}")
+    for strategy in STRATEGIES:
+        recall = np.mean([
+            len(found & reference) / len(reference) if reference else 1.0
+            for found, reference in zip(results[strategy], results["multi"])
+        ])
+        print(
+            f"{strategy:<8} {np.percentile(latencies[strategy], 50):8.2f} "
+            f"{np.percentile(latencies[strategy], 95):8.2f} {recall:7.2f}"
+        )
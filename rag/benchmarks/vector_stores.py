@@ -0,0 +1,114 @@
+"""Build time, load time, query latency and recall of Chroma vs the quantized store.
+
+Copies the chunks and embeddings of an existing collection into a fresh
+Chroma collection and into quantized stores (float16, int8 and int8 with
+the inverted file forced on), then searches each with every question.
+Recall is the share of the exact float32 top-k a store also returns.
+Run from the `rag` directory with Ollama up:
+
+    python -m benchmarks.vector_stores --collection vista-... questions.txt
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_ollama import OllamaEmbeddings
+
+from lib.vector_index import QuantizedVectorStore
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help="File with one question per line.")
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--persist-directory", default="vectordb")
+    parser.add_argument("--model", default="llama3.2:3b")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    embeddings = OllamaEmbeddings(model=args.model)
+    source = Chroma(
+        collection_name=args.collection,
+        persist_directory=args.persist_directory,
+        embedding_function=embeddings,
+    )
+    data = source.get(include=["documents", "metadatas", "embeddings"])
+    ids, texts = data["ids"], data["documents"]
+    metadatas = [m or {} for m in data["metadatas"]]
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    queries = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+
+    # Exact cosine top-k over the float32 embeddings.
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = [
+        {ids[i] for i in np.argsort(-(unit @ (q / np.linalg.norm(q))))[: args.k]}
+        for q in queries
+    ]
+
+    workdir = tempfile.mkdtemp()
+    stores = {}
+    try:
+        def build_chroma():
+            store = Chroma(collection_name="bench", persist_directory=os.path.join(workdir, "chroma"),
+                           embedding_function=embeddings, collection_metadata={"hnsw:space": "cosine"})
+            for start in range(0, len(ids), 1000):
+                store._collection.add(ids=ids[start:start + 1000], embeddings=vectors[start:start + 1000],
+                                      documents=texts[start:start + 1000], metadatas=metadatas[start:start + 1000])
+            return store
+
+        def reopen_chroma():
+            return Chroma(collection_name="bench", persist_directory=os.path.join(workdir, "chroma"),
+                          embedding_function=embeddings)
+
+        variants = {
+            "float16": {"dtype": "float16"},
+            "int8": {"dtype": "int8"},
+            "int8-ivf": {"dtype": "int8", "ivf_min_size": 0},
+        }
+
+        def build_quantized(name):
+            store = QuantizedVectorStore(os.path.join(workdir, f"{name}.vidx"), embeddings, **variants[name])
+            store.add_embeddings(texts, vectors, metadatas, ids)
+            store.persist()
+            return store
+
+        print(f"{len(ids)} chunks, {len(questions)} questions, k={args.k}")
+        print(f"{'store':<9} {'build (s)':>9} {'load (ms)':>9} {'p50 (ms)':>8} {'p95 (ms)':>8} {'recall':>7} {'size (MB)':>9}")
+        for name in ["chroma"] + list(variants):
+            if name == "chroma":
+                _, build = timed(build_chroma)
+                store, load = timed(reopen_chroma)
+                search = lambda q: store.similarity_search_by_vector(q.tolist(), k=args.k)
+                path = os.path.join(workdir, "chroma")
+                size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs)
+            else:
+                _, build = timed(lambda: build_quantized(name))
+                path = os.path.join(workdir, f"{name}.vidx")
+                store, load = timed(lambda: QuantizedVectorStore(path, embeddings, **variants[name]))
+                search = lambda q: store.similarity_search_by_vector(q, k=args.k)
+                size = os.path.getsize(path)
+
+            latencies, recalls = [], []
+            for q, reference in zip(queries, exact):
+                docs, seconds = timed(lambda: search(q))
+                latencies.append(seconds)
+                recalls.append(len({doc.id for doc in docs} & reference) / len(reference))
+            print(
+                f"{name:<9} {build:9.2f} {load * 1e3:9.1f} {np.percentile(latencies, 50) * 1e3:8.2f} "
+                f"{np.percentile(latencies, 95) * 1e3:8.2f} {np.mean(recalls):7.2f} {size / 2 ** 20:9.1f}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,89 @@
+"""Bounded admission of requests."""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class Busy(Exception):
+    """Raised when a request cannot be admitted."""
+
+
+class AdmissionController:
+    """Let at most `max_active` requests run and `max_waiting` wait for a slot.
+
+    Requests beyond that are rejected right away, and a waiting request
+    gives up after `wait_timeout` seconds, so an overloaded backend answers
+    quickly with a clear status instead of piling up threads.
+
+    Args:
+        max_active: Requests processed at once.
+        max_waiting: Requests allowed to queue for a slot.
+        wait_timeout: Seconds a queued request waits before it is rejected.
+    """
+
+    def __init__(self, max_active: int = 4, max_waiting: int = 16, wait_timeout: float = 60) -> None:
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(max_active)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self._latencies = deque(maxlen=1000)
+
+    def enter(self) -> float:
+        """Wait for a slot and return the admission time.
+
+        Raises:
+            Busy: If the queue is full or no slot frees up in time.
+        """
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                raise Busy(f"{self.waiting} requests already waiting")
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.wait_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.rejected += 1
+                raise Busy(f"no worker free after {self.wait_timeout}s")
+            self.active += 1
+        return time.perf_counter()
+
+    def leave(self, started: float) -> None:
+        """Release the slot taken by `enter`."""
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+            self._latencies.append(time.perf_counter() - started)
+        self._slots.release()
+
+    @contextmanager
+    def admit(self):
+        started = self.enter()
+        try:
+            yield
+        finally:
+            self.leave(started)
+
+    def stats(self) -> dict:
+        """Return queue depth, counters and latency percentiles of recent requests."""
+        with self._lock:
+            latencies = list(self._latencies)
+            stats = {
+                "active": self.active,
+                "waiting": self.waiting,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+        if latencies:
+            stats["p50_seconds"] = float(np.percentile(latencies, 50))
+            stats["p95_seconds"] = float(np.percentile(latencies, 95))
+        return stats
+
@@ -0,0 +1,112 @@
+"""Cache of generated answers for repeated questions over an unchanged index."""
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from lib.rerank import terms
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase a question and strip punctuation and extra whitespace."""
+    return " ".join(re.findall(r"\w+", question.lower()))
+
+
+class AnswerCache:
+    """Two-tier answer cache scoped to a namespace's index version.
+
+    The exact tier is keyed by namespace, index version, model and
+    normalized question. The semantic tier reuses an answer when the new
+    question has the same content words (`lib.rerank.terms`) as a cached
+    question and their embeddings have a cosine similarity of at least
+    `threshold`; embeddings alone barely separate questions that differ in
+    one name or number. Entries for a namespace are dropped as soon as
+    a lookup sees a newer index version.
+
+    Args:
+        embeddings: Embeddings for the semantic tier; None disables it.
+        threshold: Cosine similarity needed for a semantic hit.
+        max_entries: Most answers kept, least recently used first out.
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        threshold: float = 0.95,
+        max_entries: int = 256,
+    ) -> None:
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _check_version(self, namespace: str, version: int) -> None:
+        if self._versions.get(namespace) != version:
+            self._versions[namespace] = version
+            for key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[key]
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        if self.embeddings is None:
+            return None
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, namespace: str, version: int, model: str, question: str) -> Optional[str]:
+        """Return a cached answer, or None on a miss."""
+        key = (namespace, version, model, normalize_question(question))
+        with self._lock:
+            self._check_version(namespace, version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return self._entries[key][0]
+            question_terms = frozenset(terms(question))
+            candidates = [
+                (k, entry) for k, entry in self._entries.items()
+                if k[:3] == key[:3] and entry[1] is not None and entry[2] == question_terms
+            ]
+
+        if candidates:
+            vector = self._embed(question)
+            if vector is not None:
+                similarities = np.stack([entry[1] for _, entry in candidates]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    with self._lock:
+                        self.semantic_hits += 1
+                    return candidates[best][1][0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, namespace: str, version: int, model: str, question: str, answer: str) -> None:
+        """Cache the answer to `question`."""
+        key = (namespace, version, model, normalize_question(question))
+        vector = self._embed(question)
+        with self._lock:
+            self._check_version(namespace, version)
+            self._entries[key] = (answer, vector, frozenset(terms(question)))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Return hit counters and the overall hit rate."""
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / total if total else 0.0,
+        }
@@ -0,0 +1,115 @@
+"""In-process BM25 inverted index kept alongside the vector store."""
+import heapq
+import math
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from langchain_core.documents import Document
+
+from lib.rerank import terms
+
+
+class BM25Index:
+    """Keyword index over chunks with per-URL incremental updates.
+
+    Postings are stored per term as parallel `array` columns of chunk
+    numbers and term frequencies. Removing a URL tombstones its chunks;
+    postings are compacted once a third of the chunks are dead.
+
+    Args:
+        k1: BM25 term frequency saturation.
+        b: BM25 length normalization.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._reset()
+        # Set once the index reflects the vector store it shadows.
+        self.loaded = False
+        # Never replaced, so searches and updates always share it.
+        self._lock = threading.RLock()
+
+    def _reset(self) -> None:
+        self._docs: List[Document] = []
+        self._lengths = array("I")
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._by_url: Dict[str, List[int]] = {}
+        self._live = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def add(self, chunks: Iterable[Document]) -> None:
+        """Index chunks; each is filed under its `source` URL."""
+        with self._lock:
+            for chunk in chunks:
+                number = len(self._docs)
+                counts = Counter(terms(chunk.page_content))
+                self._docs.append(chunk)
+                self._lengths.append(sum(counts.values()))
+                self._by_url.setdefault(chunk.metadata.get("source"), []).append(number)
+                for term, tf in counts.items():
+                    if term not in self._postings:
+                        self._postings[term] = (array("I"), array("H"))
+                    ids, tfs = self._postings[term]
+                    ids.append(number)
+                    tfs.append(min(tf, 65535))
+                self._live += 1
+                self._total_length += self._lengths[number]
+
+    def remove_url(self, url: str) -> None:
+        """Drop every chunk of `url`."""
+        with self._lock:
+            for number in self._by_url.pop(url, []):
+                self._docs[number] = None
+                self._live -= 1
+                self._total_length -= self._lengths[number]
+            if len(self._docs) and self._live < len(self._docs) * 2 / 3:
+                self._compact()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            self.loaded = False
+
+    def _compact(self) -> None:
+        # Rebuilt aside and swapped in whole; the caller holds the lock.
+        compacted = BM25Index(self.k1, self.b)
+        compacted.add(doc for doc in self._docs if doc is not None)
+        self._docs = compacted._docs
+        self._lengths = compacted._lengths
+        self._postings = compacted._postings
+        self._by_url = compacted._by_url
+        self._live = compacted._live
+        self._total_length = compacted._total_length
+
+    def search(self, query: str, k: int = 5) -> List[Document]:
+        """Return the `k` best chunks for `query` by BM25 score."""
+        with self._lock:
+            if not self._live:
+                return []
+            # Tombstoned chunks count neither as documents nor towards document frequency.
+            n = self._live
+            avg_length = self._total_length / self._live
+            scores: Dict[int, float] = {}
+            for term in set(terms(query)):
+                if term not in self._postings:
+                    continue
+                ids, tfs = self._postings[term]
+                live = [(number, tf) for number, tf in zip(ids, tfs) if self._docs[number] is not None]
+                if not live:
+                    continue
+                idf = math.log(1 + (n - len(live) + 0.5) / (len(live) + 0.5))
+                for number, tf in live:
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[number] / avg_length)
+                    scores[number] = scores.get(number, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [
+                Document(page_content=self._docs[number].page_content,
+                         metadata=dict(self._docs[number].metadata))
+                for number, _ in best
+            ]
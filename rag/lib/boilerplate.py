@@ -0,0 +1,163 @@
+"""Block extraction and cross-page deduplication of scraped text."""
+import hashlib
+import re
+from typing import Dict, List, Sequence, Set, Tuple
+
+from bs4 import BeautifulSoup
+
+TAGS_TO_EXTRACT = ["span", "p", "li", "article", "h1", "h2", "h3", "h4"]
+
+
+def extract_blocks(html: str, tags: Sequence[str] = TAGS_TO_EXTRACT) -> List[str]:
+    """Extract the full text of the outermost `tags` elements as separate blocks.
+
+    An element inside an already extracted one is skipped, so inline tags
+    such as a `span` in a `p` neither split the paragraph nor repeat its text.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(["script", "style", "noscript", "template"]):
+        element.decompose()
+    blocks = []
+    for element in soup.find_all(tags):
+        if element.find_parent(tags) is not None:
+            continue
+        text = element.get_text(" ", strip=True)
+        if text:
+            blocks.append(text)
+    return blocks
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class BlockDeduplicator:
+    """Drop text blocks that already appear elsewhere in the page set.
+
+    Navigation menus, footers and cookie banners repeat on every page of a
+    site. The first page a block is seen on owns it; exact repeats on other
+    pages, and repeats within a page, are dropped. Near-duplicates are found
+    with MinHash over word shingles and dropped when their Jaccard
+    similarity to a kept block reaches `threshold`.
+
+    Ownership lives in memory only. Call `forget` when a page's chunks are
+    deleted so other pages can keep its blocks, and `claim` for pages found
+    already indexed so ownership follows the index after a restart.
+
+    Args:
+        threshold: Jaccard similarity at which two blocks count as duplicates.
+        shingle_size: Words per shingle.
+        num_perm: MinHash signature length; must be divisible by `bands`.
+        bands: LSH bands used to find near-duplicate candidates.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        shingle_size: int = 5,
+        num_perm: int = 16,
+        bands: int = 8,
+    ) -> None:
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.num_perm = num_perm
+        self.bands = bands
+        self._owners: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[Tuple[Set[tuple], str]]] = {}
+        # Block keys and LSH bands each page owns, so `forget` is cheap.
+        self._keys: Dict[str, Set[str]] = {}
+        self._bands: Dict[str, Set[Tuple[int, Tuple[int, ...]]]] = {}
+        self.blocks_in = 0
+        self.blocks_dropped = 0
+        self.chars_in = 0
+        self.chars_dropped = 0
+
+    def _shingles(self, words: List[str]) -> Set[tuple]:
+        n = self.shingle_size
+        return {tuple(words[i : i + n]) for i in range(len(words) - n + 1)}
+
+    def _signature(self, shingles: Set[tuple]) -> List[Tuple[int, Tuple[int, ...]]]:
+        minhash = [min(hash((seed, s)) for s in shingles) for seed in range(self.num_perm)]
+        rows = self.num_perm // self.bands
+        return [(b, tuple(minhash[b * rows : (b + 1) * rows])) for b in range(self.bands)]
+
+    def _is_near_duplicate(self, shingles, bands, url, kept_here) -> bool:
+        for band in bands:
+            for other, owner in self._buckets.get(band, ()):
+                if owner == url and id(other) not in kept_here:
+                    continue
+                overlap = len(shingles & other) / len(shingles | other)
+                if overlap >= self.threshold:
+                    return True
+        return False
+
+    def filter(self, url: str, blocks: List[str]) -> List[str]:
+        """Return the blocks of `url` that are not duplicates."""
+        return self._filter(url, blocks, count=True)
+
+    def claim(self, url: str, blocks: List[str]) -> None:
+        """Record the blocks of an already indexed page as if it were filtered now.
+
+        Does nothing if `url` already owns blocks, and leaves the stats alone.
+        """
+        if url not in self._keys:
+            self._filter(url, blocks, count=False)
+
+    def forget(self, url: str) -> None:
+        """Release every block `url` owns, e.g. once its chunks are deleted."""
+        for key in self._keys.pop(url, ()):
+            if self._owners.get(key) == url:
+                del self._owners[key]
+        for band in self._bands.pop(url, ()):
+            others = [entry for entry in self._buckets.get(band, ()) if entry[1] != url]
+            if others:
+                self._buckets[band] = others
+            else:
+                self._buckets.pop(band, None)
+
+    def _filter(self, url: str, blocks: List[str], count: bool) -> List[str]:
+        kept = []
+        # Blocks kept on this call, so a re-indexed page keeps its own
+        # blocks but still loses repeats within itself.
+        kept_keys = set()
+        kept_shingles = set()
+        owned = self._keys.setdefault(url, set())
+        for block in blocks:
+            if count:
+                self.blocks_in += 1
+                self.chars_in += len(block)
+            normalized = _normalize(block)
+            key = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+            owner = self._owners.setdefault(key, url)
+            duplicate = owner != url or key in kept_keys
+            if owner == url:
+                owned.add(key)
+
+            words = normalized.split()
+            if not duplicate and len(words) >= self.shingle_size:
+                shingles = self._shingles(words)
+                bands = self._signature(shingles)
+                duplicate = self._is_near_duplicate(shingles, bands, url, kept_shingles)
+                if not duplicate:
+                    for band in bands:
+                        self._buckets.setdefault(band, []).append((shingles, url))
+                    self._bands.setdefault(url, set()).update(bands)
+                    kept_shingles.add(id(shingles))
+
+            if duplicate:
+                if count:
+                    self.blocks_dropped += 1
+                    self.chars_dropped += len(block)
+                continue
+            kept_keys.add(key)
+            kept.append(block)
+        return kept
+
+    def stats(self) -> dict:
+        """Return how many blocks and characters were dropped."""
+        return {
+            "blocks_in": self.blocks_in,
+            "blocks_dropped": self.blocks_dropped,
+            "chars_in": self.chars_in,
+            "chars_dropped": self.chars_dropped,
+        }
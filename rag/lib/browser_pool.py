@@ -0,0 +1,179 @@
+"""Long-lived headless Chromium with a fixed pool of tabs."""
+import asyncio
+import threading
+import time
+from typing import Optional, Sequence
+
+from playwright.async_api import async_playwright
+
+
+class BrowserPool:
+    """Render pages in a warm browser context shared across scrapes.
+
+    Playwright runs on its own event loop thread; `render` can be called
+    from any thread and blocks until a tab is free and the page is loaded.
+    Tabs are replaced after `pages_per_tab` renders to bound memory or
+    after a failed render, and the browser is relaunched if it dies.
+    Requests for blocked resource types are aborted to speed up rendering.
+    If the browser cannot be launched, renders fail fast for `retry_after`
+    seconds before a launch is tried again.
+
+    Args:
+        tabs: Number of pages rendered at once.
+        pages_per_tab: Renders after which a tab is closed and reopened.
+        blocked_resources: Playwright resource types that are never loaded.
+        headless: Whether to run the browser headless.
+        user_agent: User agent of the browser context.
+        retry_after: Seconds after a failed launch before trying again.
+    """
+
+    def __init__(
+        self,
+        tabs: int = 4,
+        pages_per_tab: int = 50,
+        blocked_resources: Sequence[str] = ("image", "font", "media"),
+        headless: bool = True,
+        user_agent: Optional[str] = None,
+        retry_after: float = 300,
+    ) -> None:
+        self.tabs = tabs
+        self.pages_per_tab = pages_per_tab
+        self.blocked_resources = set(blocked_resources)
+        self.headless = headless
+        self.user_agent = user_agent
+        self.retry_after = retry_after
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._playwright = self._browser = self._context = None
+        self._failure = None
+        self._failed_at = None
+
+    def start(self) -> None:
+        """Launch the browser and open the tabs, if not already running.
+
+        Raises:
+            RuntimeError: If the browser could not be launched, now or
+                less than `retry_after` seconds ago.
+        """
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_after:
+                raise RuntimeError(f"Browser is unavailable: {self._failure!r}")
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, daemon=True)
+            thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._start(), loop).result()
+            except Exception as e:
+                # Leave no driver process or loop thread behind.
+                asyncio.run_coroutine_threadsafe(self._close(), loop).result()
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join()
+                loop.close()
+                self._failure, self._failed_at = e, time.monotonic()
+                print(f"Browser pool failed to start: {e!r}")
+                raise RuntimeError(f"Browser is unavailable: {e!r}") from e
+            self._loop, self._thread = loop, thread
+            self._failure = self._failed_at = None
+            print(f"Browser pool started with {self.tabs} tabs.")
+
+    async def _start(self) -> None:
+        self._playwright = await async_playwright().start()
+        self._relaunch_lock = asyncio.Lock()
+        await self._launch()
+        self._idle = asyncio.Queue()
+        for _ in range(self.tabs):
+            await self._idle.put((await self._context.new_page(), 0))
+
+    async def _launch(self) -> None:
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        self._context = await self._browser.new_context(user_agent=self.user_agent)
+        await self._context.route("**/*", self._route)
+
+    async def _route(self, route) -> None:
+        if route.request.resource_type in self.blocked_resources:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _new_page(self):
+        context = self._context
+        try:
+            return await context.new_page()
+        except Exception as e:
+            # The browser is gone; the first tab to notice relaunches it.
+            async with self._relaunch_lock:
+                if self._context is context:
+                    print(f"Relaunching the browser: {e}")
+                    try:
+                        await self._browser.close()
+                    except Exception:
+                        pass
+                    await self._launch()
+            return await self._context.new_page()
+
+    async def _replace(self, page):
+        """Close `page` and return a fresh tab, or None if none could be opened.
+
+        Never raises, so a tab slot is always put back in the pool; a None
+        slot is reopened by the next render that takes it.
+        """
+        if page is not None:
+            try:
+                await page.close()
+            except Exception:
+                pass
+        try:
+            return await self._new_page()
+        except Exception as e:
+            print(f"Could not open a browser tab: {e}")
+            return None
+
+    async def _render(self, url: str, timeout: float) -> str:
+        page, uses = await self._idle.get()
+        failed = False
+        try:
+            if page is None:
+                page = await self._new_page()
+            await page.goto(url, timeout=timeout * 1000)
+            return await page.content()
+        except Exception:
+            failed = True
+            raise
+        finally:
+            uses += 1
+            if failed or uses >= self.pages_per_tab:
+                page, uses = await self._replace(page), 0
+            await self._idle.put((page, uses))
+
+    def render(self, url: str, timeout: float = 15.0) -> str:
+        """Return the rendered HTML of `url`."""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self._render(url, timeout), self._loop)
+        # The render itself times out in Playwright; the extra margin covers
+        # waiting for a free tab.
+        return future.result(timeout * 4)
+
+    def close(self) -> None:
+        """Shut the browser down."""
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    async def _close(self) -> None:
+        # Also cleans up after a launch that failed halfway.
+        for closing in (self._context, self._browser):
+            if closing is not None:
+                try:
+                    await closing.close()
+                except Exception:
+                    pass
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._playwright = self._browser = self._context = None
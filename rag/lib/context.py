@@ -0,0 +1,87 @@
+"""Assembly of retrieved chunks into a generation prompt context."""
+import hashlib
+import re
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Llama-style tokenizers (about 4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _content_key(text: str) -> str:
+    normalized = " ".join(re.findall(r"\w+", text.lower()))
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def dedupe_chunks(docs: List[Document]) -> List[Document]:
+    """Drop repeated chunks, keeping the first of each in `docs` order.
+
+    Chunks repeat by id or content hash, and a chunk contained in an
+    earlier kept one counts as a repeat.
+    """
+    seen = set()
+    kept = []
+    for doc in docs:
+        keys = {_content_key(doc.page_content)}
+        if getattr(doc, "id", None):
+            keys.add(doc.id)
+        if keys & seen or any(doc.page_content in other.page_content for other in kept):
+            continue
+        seen |= keys
+        kept.append(doc)
+    return kept
+
+
+def pack_context(
+    docs: List[Document], budget_tokens: int = 1500, score_key: str = "retrieval_score"
+) -> Tuple[str, dict]:
+    """Deduplicate, rank and pack retrieved chunks into a token budget.
+
+    Chunks are deduplicated by id and content hash, and a chunk contained in
+    a better-ranked one is dropped. The best-scoring chunks (by `score_key`
+    metadata, else retrieval order) are taken until the budget is spent,
+    then put back in page order: pages in the order of their best chunk,
+    and chunks by `start_index` within a page.
+
+    Args:
+        docs: Retrieved chunks.
+        budget_tokens: Most estimated tokens of context.
+        score_key: Metadata key holding each chunk's score.
+
+    Returns:
+        Tuple of the context string and packing statistics.
+    """
+    ranked = sorted(
+        enumerate(docs),
+        key=lambda item: (-item[1].metadata.get(score_key, 0.0), item[0]),
+    )
+
+    unique = dedupe_chunks([doc for _, doc in ranked])
+    selected = []
+    used = 0
+    for doc in unique:
+        tokens = estimate_tokens(doc.page_content)
+        if used + tokens > budget_tokens:
+            continue
+        selected.append(doc)
+        used += tokens
+
+    page_rank = {}
+    for doc in selected:
+        page_rank.setdefault(doc.metadata.get("source"), len(page_rank))
+    selected.sort(
+        key=lambda doc: (page_rank[doc.metadata.get("source")], doc.metadata.get("start_index", 0))
+    )
+
+    context = "\n\n".join(doc.page_content for doc in selected)
+    stats = {
+        "retrieved": len(docs),
+        "duplicates": len(docs) - len(unique),
+        "packed": len(selected),
+        "context_tokens": estimate_tokens(context),
+        "budget_tokens": budget_tokens,
+    }
+    return context, stats
@@ -0,0 +1,143 @@
+"""Disk-backed embedding cache keyed by model name and text hash."""
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an embedding model with a persistent SQLite cache.
+
+    Vectors are stored as float32 blobs under ``sha256(model, kind, text)``
+    so any text embedded once, by the chunker or by the vector store, is
+    never sent to the model again. The least recently used entries are
+    evicted once the cache holds more than `max_entries` vectors.
+
+    Args:
+        embeddings: The underlying embedding model.
+        model_name: Name used to key the cache, so switching models never
+            returns stale vectors.
+        path: SQLite database file.
+        max_entries: Most vectors kept on disk.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        path: str = "embedding_cache.sqlite",
+        max_entries: int = 500_000,
+    ) -> None:
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    def _key(self, kind: str, text: str) -> str:
+        data = f"{self.model_name}\0{kind}\0{text}".encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> List[Optional[List[float]]]:
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's host parameter limit.
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return [
+            np.frombuffer(found[key], dtype=np.float32).tolist() if key in found else None
+            for key in keys
+        ]
+
+    def _store(self, keys: List[str], vectors: List[List[float]]) -> None:
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in zip(keys, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def _embed(self, kind: str, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        vectors = self._lookup(keys)
+
+        # Embed each missing text once, even if it repeats within the batch.
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            missing_keys = list(missing)
+            if kind == "query":
+                computed = [self.embeddings.embed_query(missing[missing_keys[0]])]
+            else:
+                computed = self.embeddings.embed_documents([missing[k] for k in missing_keys])
+            self._store(missing_keys, computed)
+            computed_by_key = dict(zip(missing_keys, computed))
+            vectors = [
+                vector if vector is not None else computed_by_key[key]
+                for key, vector in zip(keys, vectors)
+            ]
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, reusing cached vectors."""
+        if not texts:
+            return []
+        return self._embed("document", texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing a cached vector."""
+        return self._embed("query", [text])[0]
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the hit rate."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,78 @@
+"""Incremental, per-URL maintenance of the Chroma vector index."""
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+from langchain_core.documents import Document
+
+
+def content_hash(text: str) -> str:
+    """Return a stable hash of a page's extracted text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IncrementalIndexer:
+    """Keep a Chroma store in sync with a set of pages keyed by URL.
+
+    Every chunk carries the ``source`` URL and the ``content_hash`` of the page
+    it came from, so an update only has to touch pages that are new, changed
+    or no longer part of the link set.
+    """
+
+    def __init__(self, vectordb) -> None:
+        self.vectordb = vectordb
+
+    def indexed(self) -> Dict[str, Tuple[str, List[str]]]:
+        """Map every indexed URL to its content hash and chunk ids."""
+        pages: Dict[str, Tuple[str, List[str]]] = {}
+        data = self.vectordb.get(include=["metadatas"])
+        for chunk_id, metadata in zip(data["ids"], data["metadatas"]):
+            metadata = metadata or {}
+            url = metadata.get("source")
+            if url is None:
+                continue
+            _, ids = pages.setdefault(url, (metadata.get("content_hash", ""), []))
+            ids.append(chunk_id)
+        return pages
+
+    def check(
+        self, doc: Document, indexed: Dict[str, Tuple[str, List[str]]]
+    ) -> Tuple[bool, List[str]]:
+        """Decide whether a scraped page has to be (re-)indexed.
+
+        Stamps the page with its `content_hash`.
+
+        Returns:
+            Tuple of whether the page needs indexing and the chunk ids of
+            its previous version to delete.
+        """
+        url = doc.metadata.get("source")
+        digest = content_hash(doc.page_content)
+        doc.metadata["content_hash"] = digest
+        if url not in indexed:
+            return True, []
+        old_digest, ids = indexed[url]
+        if old_digest == digest:
+            return False, []
+        return True, list(ids)
+
+    def stale(
+        self, indexed: Dict[str, Tuple[str, List[str]]], urls: Iterable[str]
+    ) -> List[str]:
+        """Return chunk ids of pages that are no longer in `urls`."""
+        wanted = set(urls)
+        return [
+            chunk_id
+            for url, (_, ids) in indexed.items()
+            if url not in wanted
+            for chunk_id in ids
+        ]
+
+    def delete(self, ids: List[str]) -> None:
+        """Remove chunks from the store."""
+        if ids:
+            self.vectordb.delete(ids=ids)
+
+    def add(self, chunks: List[Document]) -> None:
+        """Embed and add chunks to the store."""
+        if chunks:
+            self.vectordb.add_documents(chunks)
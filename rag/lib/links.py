@@ -0,0 +1,133 @@
+"""Normalization, content addressing and crawl planning of the link sets reported by the extension."""
+import hashlib
+import os
+import re
+from typing import Iterable, List, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from lib.rerank import terms
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+CONTENT_SCHEMES = {"http", "https"}
+SKIPPED_EXTENSIONS = {
+    ".7z", ".avi", ".css", ".dmg", ".doc", ".docx", ".exe", ".gif", ".gz", ".ico", ".jpeg",
+    ".jpg", ".js", ".json", ".mov", ".mp3", ".mp4", ".pdf", ".png", ".ppt", ".pptx", ".rar",
+    ".rss", ".svg", ".tar", ".wav", ".webm", ".webp", ".woff", ".woff2", ".xls", ".xlsx",
+    ".xml", ".zip",
+}
+SOCIAL_HOSTS = {
+    "facebook.com", "instagram.com", "linkedin.com", "pinterest.com", "reddit.com",
+    "t.me", "tiktok.com", "twitter.com", "wa.me", "whatsapp.com", "x.com", "youtube.com",
+}
+UTILITY_WORDS = {
+    "account", "cart", "checkout", "login", "logout", "password", "privacy", "register",
+    "signin", "signup", "subscribe", "terms", "wishlist",
+}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of `url`: no fragment, lowercase scheme and host, no default port or trailing slash."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") if parts.path not in ("", "/") else ""
+    return urlunsplit((scheme, host, path, parts.query, ""))
+
+
+def link_set_hash(urls: Iterable[str], current_url: str = "") -> str:
+    """Order-insensitive hash of a page's normalized link set, current page included."""
+    links = {normalize_url(url) for url in urls if url}
+    if current_url:
+        links.add(normalize_url(current_url))
+    return hashlib.sha256("\n".join(sorted(links)).encode("utf-8")).hexdigest()
+
+
+def _host(url: str) -> str:
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def is_content_url(url: str) -> bool:
+    """Whether `url` can be a scrapable HTML page: http(s), not a file, not a social network."""
+    parts = urlsplit(url)
+    if parts.scheme not in CONTENT_SCHEMES or not parts.hostname:
+        return False
+    path = parts.path.lower()
+    if os.path.splitext(path)[1] in SKIPPED_EXTENSIONS:
+        return False
+    host = _host(url)
+    return not any(host == social or host.endswith("." + social) for social in SOCIAL_HOSTS)
+
+
+def score_url(url: str, position: int, total: int, origin: str = "", question: str = "") -> float:
+    """Priority of a link: same origin, early in the page and matching the question score higher.
+
+    Args:
+        url: Normalized link.
+        position: Index of the link in page (document) order.
+        total: Number of links on the page.
+        origin: Host of the current page.
+        question: Spoken question, if one is known.
+    """
+    score = 1.0 - position / max(total, 1)
+    if origin and _host(url) == origin:
+        score += 2.0
+    if _words(url) & UTILITY_WORDS:
+        score -= 1.5
+    return score + 3.0 * question_match(url, question)
+
+
+def _words(url: str) -> set:
+    parts = urlsplit(url)
+    return set(re.findall(r"[a-z0-9]+", (parts.path + " " + parts.query).lower()))
+
+
+def question_match(url: str, question: str) -> float:
+    """Share of the question's terms found in the path or query of `url`."""
+    question_terms = set(terms(question)) if question else set()
+    if not question_terms:
+        return 0.0
+    return len(question_terms & _words(url)) / len(question_terms)
+
+
+def plan_urls(
+    urls: Iterable[str], current_url: str = "", question: str = "", budget: int = 20
+) -> Tuple[List[str], List[str]]:
+    """Pick the links worth scraping first.
+
+    Links are normalized and deduplicated, non-content links are dropped
+    and the rest are ranked by `score_url`. The current page always comes
+    first.
+
+    Returns:
+        Tuple of the `budget` best links, in priority order, and the
+        remaining links for lazy indexing.
+    """
+    current = normalize_url(current_url) if current_url else ""
+    candidates = [
+        url for url in dict.fromkeys(normalize_url(url) for url in urls if url)
+        if url != current and is_content_url(url)
+    ]
+    origin = _host(current) if current else ""
+    ranked = sorted(
+        range(len(candidates)),
+        key=lambda i: -score_url(candidates[i], i, len(candidates), origin, question),
+    )
+    ordered = ([current] if current else []) + [candidates[i] for i in ranked]
+    return ordered[:budget], ordered[budget:]
+
+
+def match_urls(urls: Iterable[str], question: str, limit: int = 5) -> Tuple[List[str], List[str]]:
+    """Pick the links whose path or query mentions the question's terms.
+
+    Returns:
+        Tuple of at most `limit` matching links, best match first, and the
+        remaining links in their original order.
+    """
+    urls = list(urls)
+    scores = {url: question_match(url, question) for url in urls}
+    matched = sorted((url for url in urls if scores[url] > 0), key=lambda url: -scores[url])[:limit]
+    picked = set(matched)
+    return matched, [url for url in urls if url not in picked]
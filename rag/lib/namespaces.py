@@ -0,0 +1,227 @@
+"""Per-session index namespaces with LRU eviction and a size budget."""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List
+
+from langchain_core.documents import Document
+
+from lib.bm25 import BM25Index
+from lib.boilerplate import BlockDeduplicator
+
+
+def collection_name(namespace: str) -> str:
+    """Map an arbitrary session or site id to a valid Chroma collection name."""
+    slug = re.sub(r"[^a-zA-Z0-9]+", "-", namespace).strip("-")[:24] or "default"
+    digest = hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:12]
+    return f"vista-{slug}-{digest}"
+
+
+class Namespace:
+    """One tenant's slice of the vector store."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.collection_name = collection_name(name)
+        self.vectordb = None
+        self.version = 0
+        self.loaded_version = None
+        self.chunks = 0
+        self.last_used = time.time()
+        # Held while the namespace is queried or its handle/version changes.
+        self.lock = threading.RLock()
+        # Held for the whole of an ingest, so ingests of one namespace run
+        # one at a time while queries keep going.
+        self.ingest_lock = threading.Lock()
+        # Bumped to cancel an in-flight ingest when a new link set arrives.
+        self.generation = 0
+        # Hash of the link set being indexed, its current page, and the
+        # planned links of recent link sets, whose pages are kept.
+        self.link_set = None
+        self.current_url = ''
+        self.link_sets: "OrderedDict[str, set]" = OrderedDict()
+        # (urls, prune) batch waiting for the background indexing worker.
+        self.pending_urls = None
+        self.worker = None
+        # Set once a full ingest of `links` finished without being superseded.
+        self.complete = False
+        # Links left out of the crawl plan, indexed when questions need them.
+        self.deferred_urls = []
+        # URLs whose current content is queryable; `indexed` is notified
+        # whenever one is added or the worker stops.
+        self.ready_urls = set()
+        self.indexed = threading.Condition(self.lock)
+        # Owners of text blocks already indexed in this namespace.
+        self.deduplicator = BlockDeduplicator()
+        # Keyword index mirroring the collection's chunks.
+        self.keywords = BM25Index()
+
+
+class NamespaceRegistry:
+    """Track namespaces, keep a bounded number of handles open and evict cold ones.
+
+    Args:
+        open_collection: Callable returning a vector store for a collection name.
+        max_namespaces: Most namespaces kept on disk.
+        max_open: Most vector store handles kept open in memory.
+        max_chunks: Chunk budget across all namespaces, a proxy for disk use.
+    """
+
+    def __init__(
+        self,
+        open_collection: Callable[[str], object],
+        max_namespaces: int = 32,
+        max_open: int = 8,
+        max_chunks: int = 200_000,
+    ) -> None:
+        self.open_collection = open_collection
+        self.max_namespaces = max_namespaces
+        self.max_open = max_open
+        self.max_chunks = max_chunks
+        self._namespaces: "OrderedDict[str, Namespace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def adopt(self, collection_names: Iterable[str]) -> None:
+        """Register collections left on disk by a previous run so they count towards the budget.
+
+        Each collection is opened once to count its chunks; the handle is not kept.
+        """
+        with self._lock:
+            names = [name for name in dict.fromkeys(collection_names)
+                     if name.startswith("vista-") and name not in self._by_collection()]
+        sizes = {}
+        for name in names:
+            try:
+                sizes[name] = len(self.open_collection(name).get(include=[])["ids"])
+            except Exception as e:
+                print(f"Counting chunks of {name} failed: {e}")
+                sizes[name] = 0
+        with self._lock:
+            for name in names:
+                if name in self._by_collection():
+                    continue
+                namespace = Namespace(name)
+                namespace.collection_name = name
+                namespace.chunks = sizes[name]
+                self._namespaces[name] = namespace
+                self._namespaces.move_to_end(name, last=False)
+
+    def get(self, name: str) -> Namespace:
+        """Return the namespace for `name`, marking it most recently used."""
+        with self._lock:
+            namespace = self._namespaces.get(name)
+            if namespace is None:
+                # A collection adopted from disk is registered under its
+                # collection name; take it over instead of opening it twice.
+                adopted = self._namespaces.get(collection_name(name))
+                if adopted is not None and adopted.collection_name == collection_name(name):
+                    namespace = self._namespaces.pop(collection_name(name))
+                    namespace.name = name
+                else:
+                    namespace = Namespace(name)
+                self._namespaces[name] = namespace
+            self._namespaces.move_to_end(name)
+            namespace.last_used = time.time()
+        return namespace
+
+    def vectordb(self, namespace: Namespace):
+        """Return an open handle for `namespace`, reopening it only if its index changed."""
+        with namespace.lock:
+            if namespace.vectordb is None or namespace.loaded_version != namespace.version:
+                namespace.vectordb = self.open_collection(namespace.collection_name)
+                namespace.loaded_version = namespace.version
+        self._close_cold_handles()
+        return namespace.vectordb
+
+    def persist(self, namespace: Namespace) -> None:
+        """Write the pending changes of the namespace's open handle, for stores that batch them."""
+        with namespace.lock:
+            persist = getattr(namespace.vectordb, "persist", None)
+            if persist is not None:
+                persist()
+
+    def keywords(self, namespace: Namespace) -> BM25Index:
+        """Return the namespace's keyword index, building it from the collection after a restart."""
+        with namespace.lock:
+            if not namespace.keywords.loaded:
+                stored = self.vectordb(namespace).get(include=["documents", "metadatas"])
+                namespace.keywords.clear()
+                namespace.keywords.add(
+                    Document(page_content=text, metadata=metadata or {}, id=id)
+                    for id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+                )
+                namespace.keywords.loaded = True
+        return namespace.keywords
+
+    def drop(self, namespace: Namespace) -> None:
+        """Delete the namespace's collection; the caller must hold its lock."""
+        vectordb = namespace.vectordb or self.open_collection(namespace.collection_name)
+        vectordb.delete_collection()
+        namespace.vectordb = None
+        namespace.chunks = 0
+        namespace.deduplicator = BlockDeduplicator()
+        namespace.keywords.clear()
+        namespace.ready_urls.clear()
+        namespace.complete = False
+        namespace.version += 1
+
+    def evict(self) -> List[str]:
+        """Delete least recently used namespaces until the budget is met.
+
+        Namespaces that are busy indexing or answering are never evicted.
+
+        Returns:
+            Names of the evicted namespaces.
+        """
+        evicted = []
+        with self._lock:
+            for name in list(self._namespaces):
+                if not self._over_budget():
+                    break
+                namespace = self._namespaces[name]
+                if any(other is not namespace and other.collection_name == namespace.collection_name
+                       for other in self._namespaces.values()):
+                    # Never delete a collection another entry still uses.
+                    continue
+                if not namespace.ingest_lock.acquire(blocking=False):
+                    continue
+                if not namespace.lock.acquire(blocking=False):
+                    namespace.ingest_lock.release()
+                    continue
+                try:
+                    self.drop(namespace)
+                    del self._namespaces[name]
+                    evicted.append(name)
+                except Exception as e:
+                    print(e)
+                finally:
+                    namespace.lock.release()
+                    namespace.ingest_lock.release()
+        if evicted:
+            print(f"Evicted namespaces: {', '.join(evicted)}")
+        return evicted
+
+    def _over_budget(self) -> bool:
+        total_chunks = sum(ns.chunks for ns in self._namespaces.values())
+        return len(self._namespaces) > self.max_namespaces or total_chunks > self.max_chunks
+
+    def _close_cold_handles(self) -> None:
+        with self._lock:
+            open_namespaces = [ns for ns in self._namespaces.values() if ns.vectordb is not None]
+            for namespace in open_namespaces[: max(0, len(open_namespaces) - self.max_open)]:
+                # A handle being written by an ingest stays open, so reads
+                # never reopen the file behind the ingest's back.
+                if not namespace.ingest_lock.acquire(blocking=False):
+                    continue
+                if namespace.lock.acquire(blocking=False):
+                    try:
+                        self.persist(namespace)
+                        namespace.vectordb = None
+                    finally:
+                        namespace.lock.release()
+                namespace.ingest_lock.release()
+
+    def _by_collection(self):
+        return {ns.collection_name for ns in self._namespaces.values()}
@@ -0,0 +1,123 @@
+"""On-disk cache of fetched pages with HTTP validators."""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+
+class PageCache:
+    """Store page HTML with its ETag/Last-Modified validators.
+
+    Entries younger than `ttl` seconds are served without touching the
+    network; older ones are revalidated with a conditional request. Once
+    the files add up to more than `max_bytes`, the least recently used
+    entries are deleted until the cache is back under 90% of the bound.
+
+    Args:
+        path: Directory holding one JSON file per URL.
+        ttl: Seconds an entry is considered fresh.
+        max_bytes: Bound on the total size of the cache files.
+    """
+
+    def __init__(self, path: str = "page_cache", ttl: float = 600, max_bytes: int = 256 * 2**20) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._size = sum(size for _, _, size in self._files())
+
+    def _file(self, url: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str) -> Optional[dict]:
+        """Return the cached entry for `url`, fresh or not."""
+        file = self._file(url)
+        try:
+            with open(file, encoding="utf-8") as f:
+                entry = json.load(f)
+            # The modification time orders entries for eviction.
+            os.utime(file)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    def validators(self, entry: Optional[dict]) -> dict:
+        """Return conditional request headers for a cached entry."""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(
+        self,
+        url: str,
+        html: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        rendered: bool = False,
+    ) -> dict:
+        """Store a page and return its entry."""
+        entry = {
+            "url": url,
+            "html": html,
+            "etag": etag,
+            "last_modified": last_modified,
+            "rendered": rendered,
+            "fetched_at": time.time(),
+        }
+        self._write(url, entry)
+        return entry
+
+    def touch(self, url: str, entry: dict) -> dict:
+        """Mark an entry as fresh again after a 304 response."""
+        entry["fetched_at"] = time.time()
+        self._write(url, entry)
+        return entry
+
+    def _write(self, url: str, entry: dict) -> None:
+        target = self._file(url)
+        tmp = f"{target}.{threading.get_ident()}.tmp"
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            self._size += os.path.getsize(tmp) - self._getsize(target)
+            os.replace(tmp, target)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _getsize(self, file: str) -> int:
+        try:
+            return os.path.getsize(file)
+        except OSError:
+            return 0
+
+    def _files(self):
+        """Yield `(mtime, file, size)` of every cache entry."""
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                yield stat.st_mtime, entry.path, stat.st_size
+
+    def _evict(self) -> None:
+        files = sorted(self._files())
+        self._size = sum(size for _, _, size in files)
+        for _, file, size in files:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(file)
+            except OSError:
+                continue
+            self._size -= size
@@ -0,0 +1,153 @@
+"""Streaming pipeline with bounded queues between stages."""
+import queue
+import threading
+import time
+from typing import Any, Iterable, List, Sequence
+
+_DONE = object()
+
+
+class StageMetrics:
+    """Throughput counters for one pipeline stage."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        # Time spent doing work, and time blocked on a full downstream queue,
+        # both summed over the workers of the stage.
+        self.busy = 0.0
+        self.blocked = 0.0
+
+    def __str__(self) -> str:
+        rate = self.items_in / self.busy if self.busy else 0.0
+        return (
+            f"{self.name}: {self.items_in} in, {self.items_out} out, "
+            f"busy {self.busy:.2f}s, blocked {self.blocked:.2f}s, {rate:.2f} items/s"
+        )
+
+
+class StreamingPipeline:
+    """Run a source and a chain of stages concurrently.
+
+    Each stage runs in its own thread, or in several for a stage given a
+    worker count, and is connected to the next by a queue of at most
+    `queue_size` items, so a slow stage applies backpressure upstream
+    instead of letting work pile up in memory. Stages with several
+    workers do not preserve item order.
+
+    Args:
+        source: Iterable producing the pipeline's input, consumed in its own thread.
+        stages: `(name, fn)` or `(name, fn, workers)` tuples. `fn` takes one
+            item and returns an iterable of items for the next stage.
+        queue_size: Capacity of each queue between stages.
+    """
+
+    def __init__(
+        self,
+        source: Iterable[Any],
+        stages: List[Sequence[Any]],
+        queue_size: int = 4,
+        source_name: str = "source",
+    ) -> None:
+        self.source = source
+        self.stages = [(stage[0], stage[1]) for stage in stages]
+        self.workers = [stage[2] if len(stage) > 2 else 1 for stage in stages]
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.metrics = [StageMetrics(source_name)] + [StageMetrics(name) for name, _ in self.stages]
+        self._stop = threading.Event()
+        self._error = None
+        # Guards the shared metrics and the count of running workers per stage.
+        self._lock = threading.Lock()
+        self._running = list(self.workers)
+
+    def _put(self, q: queue.Queue, item: Any, metrics: StageMetrics) -> None:
+        start = time.perf_counter()
+        q.put(item)
+        with self._lock:
+            metrics.blocked += time.perf_counter() - start
+
+    def _fail(self, error: Exception) -> None:
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _run_source(self) -> None:
+        metrics = self.metrics[0]
+        try:
+            iterator = iter(self.source)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    metrics.busy += time.perf_counter() - start
+                metrics.items_in += 1
+                metrics.items_out += 1
+                self._put(self.queues[0], item, metrics)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(self.workers[0]):
+                self.queues[0].put(_DONE)
+
+    def _run_stage(self, index: int) -> None:
+        _, fn = self.stages[index]
+        metrics = self.metrics[index + 1]
+        inbox = self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.queues) else None
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                # After a failure keep draining so upstream never blocks.
+                if self._stop.is_set():
+                    continue
+                try:
+                    start = time.perf_counter()
+                    outputs = list(fn(item) or ())
+                    busy = time.perf_counter() - start
+                except Exception as e:
+                    self._fail(e)
+                    continue
+                with self._lock:
+                    metrics.items_in += 1
+                    metrics.items_out += len(outputs)
+                    metrics.busy += busy
+                if outbox is not None:
+                    for output in outputs:
+                        self._put(outbox, output, metrics)
+        finally:
+            # The last worker of a stage to finish ends every worker of the next.
+            with self._lock:
+                self._running[index] -= 1
+                last = self._running[index] == 0
+            if last and outbox is not None:
+                for _ in range(self.workers[index + 1]):
+                    outbox.put(_DONE)
+
+    def run(self) -> List[StageMetrics]:
+        """Run the pipeline to completion.
+
+        Returns:
+            Metrics of the source followed by each stage.
+
+        Raises:
+            Exception: The first error raised by the source or any stage.
+        """
+        threads = [threading.Thread(target=self._run_source, daemon=True)]
+        threads += [
+            threading.Thread(target=self._run_stage, args=(i,), daemon=True)
+            for i in range(len(self.stages))
+            for _ in range(self.workers[i])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.metrics
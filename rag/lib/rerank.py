@@ -0,0 +1,131 @@
+"""Second-stage reranking of retrieved chunks on CPU."""
+import hashlib
+import re
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "me", "of", "on", "or", "page", "site",
+    "tell", "that", "the", "this", "to", "what", "when", "where", "which", "who",
+    "why", "with", "you", "your",
+}
+
+
+def terms(text: str) -> List[str]:
+    """Lowercase word tokens of `text` without stopwords."""
+    return [t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS]
+
+
+class Reranker(ABC):
+    """Rescore candidate chunks for a query and keep the best ones.
+
+    Subclasses implement `_score_batch`. Scoring runs in batches of
+    `batch_size` until `time_budget` seconds are spent; chunks not scored by
+    then keep their retrieval order after the scored ones. Scores are
+    cached per (query, chunk).
+
+    Args:
+        batch_size: Chunks scored per call to `_score_batch`.
+        time_budget: Seconds allowed for scoring, or None for no limit.
+        cache_size: Most (query, chunk) scores kept.
+    """
+
+    def __init__(self, batch_size: int = 16, time_budget: Optional[float] = 0.5, cache_size: int = 10_000) -> None:
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _score_batch(self, query: str, texts: List[str]) -> List[float]:
+        """Score each of `texts` against `query`; higher is better."""
+
+    def _key(self, query: str, text: str) -> tuple:
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return (" ".join(terms(query)) or query.lower(), digest)
+
+    def rerank(self, query: str, docs: List[Document], top_n: int = 5) -> List[Document]:
+        """Return the `top_n` best chunks, each with `rerank_score` metadata."""
+        keys = [self._key(query, doc.page_content) for doc in docs]
+        scores: List[Optional[float]] = []
+        with self._lock:
+            for key in keys:
+                scores.append(self._cache.get(key))
+
+        start = time.perf_counter()
+        todo = [i for i, score in enumerate(scores) if score is None]
+        for b in range(0, len(todo), self.batch_size):
+            if self.time_budget is not None and time.perf_counter() - start > self.time_budget:
+                print(f"Reranking stopped after its time budget with {len(todo) - b} chunks unscored.")
+                break
+            batch = todo[b : b + self.batch_size]
+            batch_scores = self._score_batch(query, [docs[i].page_content for i in batch])
+            with self._lock:
+                for i, score in zip(batch, batch_scores):
+                    scores[i] = float(score)
+                    self._cache[keys[i]] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        for doc, score in zip(docs, scores):
+            doc.metadata["rerank_score"] = float("-inf") if score is None else score
+        # Stable sort keeps retrieval order among unscored chunks.
+        ranked = sorted(docs, key=lambda doc: -doc.metadata["rerank_score"])
+        return ranked[:top_n]
+
+
+class HybridReranker(Reranker):
+    """Blend embedding similarity with query term coverage.
+
+    Chunk embeddings come from the (cached) embedding model, so chunks that
+    were indexed through the cache are scored without calling the model.
+
+    Args:
+        embeddings: Embedding model used for the similarity part.
+        alpha: Weight of the embedding similarity; the rest goes to term coverage.
+    """
+
+    def __init__(self, embeddings: Embeddings, alpha: float = 0.7, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.embeddings = embeddings
+        self.alpha = alpha
+
+    def _score_batch(self, query: str, texts: List[str]) -> List[float]:
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        matrix = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        norms[norms == 0] = 1.0
+        similarity = matrix @ query_vector / norms
+
+        query_terms = set(terms(query))
+        coverage = np.asarray([
+            len(query_terms & set(terms(text))) / len(query_terms) if query_terms else 0.0
+            for text in texts
+        ])
+        return (self.alpha * similarity + (1 - self.alpha) * coverage).tolist()
+
+
+class CrossEncoderReranker(Reranker):
+    """Score (query, chunk) pairs with a sentence-transformers cross-encoder.
+
+    Args:
+        model_name: Cross-encoder checkpoint, loaded on CPU.
+    """
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", **kwargs) -> None:
+        super().__init__(**kwargs)
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def _score_batch(self, query: str, texts: List[str]) -> List[float]:
+        return self.model.predict([(query, text) for text in texts], batch_size=self.batch_size).tolist()
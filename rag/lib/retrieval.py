@@ -0,0 +1,159 @@
+"""Retrieval strategies over a vector store, with optional multi-query expansion
+and keyword search fused in."""
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
+from typing import List, Literal, Sequence
+
+from langchain.retrievers.multi_query import LineListOutputParser
+from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
+
+RetrievalStrategyType = Literal["single", "multi", "fast"]
+
+QUERY_PROMPT = PromptTemplate(
+    input_variables=["question"],
+    template="""You are an AI language model assistant. Your task is to generate five
+    different versions of the given user question to retrieve relevant documents from a vector
+    database. By generating multiple perspectives on the user question, your goal is to help
+    the user overcome some of the limitations of the distance-based similarity search.
+    Provide these alternative questions separated by newlines.
+    Original question: {question}""",
+)
+
+
+def unique_union(results: Sequence[List[Document]], rrf_k: int = 60) -> List[Document]:
+    """Merge result lists, keeping the first occurrence of each chunk.
+
+    Each chunk's `retrieval_score` metadata is set to its reciprocal rank
+    fusion score over all lists, so chunks found by several queries rank
+    higher.
+    """
+    merged = {}
+    for result in results:
+        for rank, doc in enumerate(result):
+            key = (doc.page_content, doc.metadata.get("source"))
+            if key not in merged:
+                merged[key] = doc
+                doc.metadata["retrieval_score"] = 0.0
+            merged[key].metadata["retrieval_score"] += 1.0 / (rrf_k + rank + 1)
+    return list(merged.values())
+
+
+class Retriever:
+    """Retrieve context for a question with a configurable strategy.
+
+    - ``single``: one MMR search for the question.
+    - ``multi``: an LLM writes rewrites of the question and the question and
+      all rewrites are searched in parallel.
+    - ``fast``: the single search and the LLM expansion start together. The
+      rewrites are streamed and generation is stopped at `deadline` seconds,
+      so a slow expansion never keeps competing with the answer; the
+      rewrites completed by then are searched, or only the single query if
+      there are none.
+
+    When a keyword index is passed to `retrieve`, every query is also
+    looked up there and the keyword hits are fused with the vector hits by
+    reciprocal rank, so exact names and numbers are found without waiting
+    for the expansion.
+
+    Args:
+        llm: Model writing the query rewrites.
+        strategy: Default strategy.
+        k: Documents returned per search.
+        fetch_k: Candidates fetched per search before MMR.
+        deadline: Seconds the ``fast`` strategy waits for the expansion.
+        max_workers: Threads shared by searches and expansions.
+    """
+
+    def __init__(
+        self,
+        llm,
+        strategy: RetrievalStrategyType = "fast",
+        k: int = 5,
+        fetch_k: int = 20,
+        deadline: float = 2.0,
+        max_workers: int = 8,
+    ) -> None:
+        self.strategy = strategy
+        self.k = k
+        self.fetch_k = fetch_k
+        self.deadline = deadline
+        self.expansion_chain = QUERY_PROMPT | llm | LineListOutputParser()
+        # Without a parser, so closing its stream reaches the model at once.
+        self.rewrite_chain = QUERY_PROMPT | llm
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def expand(self, question: str) -> List[str]:
+        """Return LLM-written rewrites of `question`."""
+        return [q.strip() for q in self.expansion_chain.invoke({"question": question}) if q.strip()]
+
+    def expand_until(self, question: str, deadline: float) -> List[str]:
+        """Return the rewrites of `question` completed before `deadline` (a `time.monotonic()` value).
+
+        Closing the stream at the deadline stops the model from generating
+        the remaining rewrites.
+        """
+        text = ""
+        stream = self.rewrite_chain.stream({"question": question})
+        finished = True
+        try:
+            for piece in stream:
+                text += piece.content
+                if time.monotonic() >= deadline:
+                    finished = False
+                    break
+        finally:
+            stream.close()
+        lines = text.split("\n")
+        if not finished:
+            # The last line may be a rewrite cut off mid-sentence.
+            lines = lines[:-1]
+        return [line.strip() for line in lines if line.strip()]
+
+    def search(self, vectordb, query: str) -> List[Document]:
+        return vectordb.max_marginal_relevance_search(query, k=self.k, fetch_k=self.fetch_k)
+
+    def _search_all(self, vectordb, queries: List[str]) -> List[List[Document]]:
+        return list(self._executor.map(lambda q: self.search(vectordb, q), queries))
+
+    def _keyword_search_all(self, keywords, queries: List[str]) -> List[List[Document]]:
+        if keywords is None:
+            return []
+        return [keywords.search(q, k=self.k) for q in queries]
+
+    def retrieve(
+        self, vectordb, question: str, strategy: RetrievalStrategyType = None, keywords=None
+    ) -> List[Document]:
+        """Return the documents retrieved for `question`.
+
+        Args:
+            keywords: Optional `BM25Index` searched alongside the vector store.
+        """
+        strategy = strategy or self.strategy
+        if strategy == "single":
+            return unique_union([self.search(vectordb, question)] + self._keyword_search_all(keywords, [question]))
+
+        if strategy == "multi":
+            queries = [question] + self.expand(question)
+            return unique_union(self._search_all(vectordb, queries) + self._keyword_search_all(keywords, queries))
+
+        if strategy == "fast":
+            single = self._executor.submit(self.search, vectordb, question)
+            expansion = self._executor.submit(
+                self.expand_until, question, time.monotonic() + self.deadline)
+            keyword_results = self._keyword_search_all(keywords, [question])
+            wait([expansion], timeout=self.deadline)
+            try:
+                rewrites = expansion.result(timeout=0) if expansion.done() else None
+            except (Exception, TimeoutError) as e:
+                print(e)
+                rewrites = None
+            if not rewrites:
+                print("Query expansion missed the deadline; using the single query.")
+                return unique_union([single.result()] + keyword_results)
+            return unique_union(
+                [single.result()] + self._search_all(vectordb, rewrites)
+                + keyword_results + self._keyword_search_all(keywords, rewrites)
+            )
+
+        raise ValueError(f"Got unexpected retrieval strategy: {strategy}")
@@ -1,16 +1,180 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+import psutil
+import requests
 from langchain_community.document_loaders import AsyncChromiumLoader
-from langchain_community.document_transformers import BeautifulSoupTransformer
+from langchain_core.documents import Document
+
+from lib.boilerplate import extract_blocks
+from lib.page_cache import PageCache
 
 
 class Scrape:
-    def __init__(self) -> None:
-        pass
+    """Fetch pages, preferring the page cache and plain HTTP over a browser render.
+
+    Args:
+        cache: Page cache; a default on-disk cache is used if omitted.
+        max_workers: Pages fetched at once.
+        per_host_limit: Pages fetched at once from any single host.
+        timeout: Seconds allowed for each HTTP request or browser render.
+        min_static_chars: Extracted text length above which a plain HTTP
+            response is used as is, without rendering the page in Chromium.
+        browser: Shared `BrowserPool` for renders; without one each render
+            launches its own Chromium.
+    """
+
+    def __init__(
+        self,
+        cache: PageCache = None,
+        max_workers: int = 8,
+        per_host_limit: int = 2,
+        timeout: float = 15.0,
+        min_static_chars: int = 500,
+        browser=None,
+    ) -> None:
+        self.cache = cache if cache is not None else PageCache()
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.min_static_chars = min_static_chars
+        self.browser = browser
+        self.session = requests.Session()
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+
+    def transform(self, docs):
+        """Replace each page's HTML with its text blocks, one per line."""
+        return [
+            Document(page_content="\n".join(extract_blocks(doc.page_content)), metadata=doc.metadata)
+            for doc in docs
+        ]
+
+    def _document(self, url, html):
+        return self.transform([Document(page_content=html, metadata={"source": url})])[0]
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def _render(self, url):
+        if self.browser is not None:
+            return self.browser.render(url, timeout=self.timeout)
+        loader = AsyncChromiumLoader([url])
+        return asyncio.run(asyncio.wait_for(loader.ascrape_playwright(url), self.timeout))
+
+    def fetch(self, url):
+        """Return the extracted page for `url`.
+
+        A fresh cache entry is served directly. Otherwise the page is
+        revalidated or fetched over plain HTTP, and only rendered in Chromium
+        when the static HTML carries too little text. If the render fails,
+        the static page or else the stale cache entry is used.
+
+        Returns:
+            The page, or None if it could not be fetched at all.
+        """
+        entry = self.cache.get(url)
+        if entry and self.cache.is_fresh(entry):
+            return self._document(url, entry["html"])
+
+        with self._host_slot(url):
+            try:
+                response = self.session.get(
+                    url, headers=self.cache.validators(entry), timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                print(f"Fetching {url} failed: {e}")
+                response = None
+
+            if response is not None and response.status_code == 304 and entry:
+                entry = self.cache.touch(url, entry)
+                return self._document(url, entry["html"])
+
+            etag = last_modified = None
+            static = None
+            if response is not None and response.ok:
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if "html" in response.headers.get("Content-Type", ""):
+                    static = self._document(url, response.text)
+                    if len(static.page_content) >= self.min_static_chars:
+                        self.cache.put(url, response.text, etag, last_modified)
+                        return static
+
+            try:
+                html = self._render(url)
+            except Exception as e:
+                html = f"Error: {e!r}"
+            if not html.startswith("Error:"):
+                self.cache.put(url, html, etag, last_modified, rendered=True)
+                return self._document(url, html)
+            print(f"Rendering {url} failed: {html}")
+            if static is not None and static.page_content:
+                return static
+            if entry:
+                return self._document(url, entry["html"])
+            return None
 
     def scrape(self, urls):
-        loader = AsyncChromiumLoader(urls)
-        docs = loader.load()
-        bs_transformer = BeautifulSoupTransformer()
-        docs_transformed = bs_transformer.transform_documents(
-            docs, tags_to_extract=["span", "p", "li", "article", "h1", "h2", "h3", "h4"]
-        )
-        return docs_transformed
+        return list(self.scrape_iter(urls))
+
+    def scrape_iter(self, urls):
+        """Yield each page as soon as it has been fetched and extracted.
+
+        Pages that could not be fetched are skipped. At most `max_workers` pages are in flight and finished pages are
+        yielded in the order of `urls`, so a slow consumer holds back fetching.
+        Per-page latency and the peak RSS of this process and its browser
+        children are reported once the batch is done.
+        """
+        urls = iter(urls)
+        pending = deque()
+        latencies = []
+        peak_rss = 0
+
+        def timed_fetch(url):
+            start = time.perf_counter()
+            try:
+                return self.fetch(url)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for url in urls:
+                    pending.append(executor.submit(timed_fetch, url))
+                    if len(pending) >= self.max_workers:
+                        break
+                while pending:
+                    doc = pending.popleft().result()
+                    peak_rss = max(peak_rss, self._rss())
+                    next_url = next(urls, None)
+                    if next_url is not None:
+                        pending.append(executor.submit(timed_fetch, next_url))
+                    if doc is not None:
+                        yield doc
+        finally:
+            if latencies:
+                print(
+                    f"Scraped {len(latencies)} pages: "
+                    f"mean {np.mean(latencies):.2f}s, p95 {np.percentile(latencies, 95):.2f}s, "
+                    f"peak RSS {peak_rss / 2**20:.0f} MiB"
+                )
+
+    def _rss(self):
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss
@@ -1,88 +1,85 @@
 """Experimental **text splitter** based on semantic similarity."""
 from tqdm import tqdm
-import copy
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, Iterable, List, Literal, Optional, Sequence, Tuple, cast
 
 import numpy as np
-from langchain_community.utils.math import (
-    cosine_similarity,
-)
 from langchain_core.documents import BaseDocumentTransformer, Document
 from langchain_core.embeddings import Embeddings
 
 
-def combine_sentences(sentences: List[dict], buffer_size: int = 1) -> List[dict]:
-    """Combine sentences based on buffer size.
+def sentence_spans(text: str, sentence_split_regex: str) -> np.ndarray:
+    """Locate sentences as character offsets into `text`.
+
+    Yields the same pieces as `re.split(sentence_split_regex, text)`, but as
+    a compact table of `(start, end)` offsets instead of copied strings.
 
     Args:
-        sentences: List of sentences to combine.
-        buffer_size: Number of sentences to combine. Defaults to 1.
+        text: Text to split.
+        sentence_split_regex: Regex matching the gaps between sentences.
 
     Returns:
-        List of sentences with combined sentences.
+        Integer array of shape `(n_sentences, 2)`.
     """
+    spans = []
+    start = 0
+    for match in re.finditer(sentence_split_regex, text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+    return np.asarray(spans, dtype=np.int64)
 
-    # Go through each sentence dict
-    for i in range(len(sentences)):
-        # Create a string that will hold the sentences which are joined
-        combined_sentence = ""
 
-        # Add sentences before the current one, based on the buffer size.
-        for j in range(i - buffer_size, i):
-            # Check if the index j is not negative
-            # (to avoid index out of range like on the first one)
-            if j >= 0:
-                # Add the sentence at index j to the combined_sentence string
-                combined_sentence += sentences[j]["sentence"] + " "
+def combine_sentences(text: str, spans: np.ndarray, buffer_size: int = 1) -> List[str]:
+    """Combine sentences based on buffer size.
 
-        # Add the current sentence
-        combined_sentence += sentences[i]["sentence"]
+    Each window runs from the start of the first buffered sentence to the end
+    of the last one, so it is a single slice of `text` rather than a string
+    built up sentence by sentence.
 
-        # Add sentences after the current one, based on the buffer size
-        for j in range(i + 1, i + 1 + buffer_size):
-            # Check if the index j is within the range of the sentences list
-            if j < len(sentences):
-                # Add the sentence at index j to the combined_sentence string
-                combined_sentence += " " + sentences[j]["sentence"]
+    Args:
+        text: The text the spans point into.
+        spans: Sentence offsets from `sentence_spans`.
+        buffer_size: Number of sentences to combine. Defaults to 1.
 
-        # Then add the whole thing to your dict
-        # Store the combined sentence in the current sentence dict
-        sentences[i]["combined_sentence"] = combined_sentence
+    Returns:
+        List of combined sentences, one per sentence.
+    """
+    n = len(spans)
+    index = np.arange(n)
+    first = np.maximum(index - buffer_size, 0)
+    last = np.minimum(index + buffer_size, n - 1)
+    starts = spans[first, 0].tolist()
+    ends = spans[last, 1].tolist()
+    return [text[start:end] for start, end in zip(starts, ends)]
 
-    return sentences
 
+def calculate_cosine_distances(embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+    """Calculate cosine distances between adjacent sentence embeddings.
 
-def calculate_cosine_distances(sentences: List[dict]) -> Tuple[List[float], List[dict]]:
-    """Calculate cosine distances between sentences.
+    All embeddings are stacked into one float32 matrix and normalized once,
+    so the distances come out of a single row-wise dot product instead of a
+    `cosine_similarity` call per pair.
 
     Args:
-        sentences: List of sentences to calculate distances for.
+        embeddings: Embeddings of the combined sentences, in order.
 
     Returns:
-        Tuple of distances and sentences.
+        Array of `len(embeddings) - 1` distances, where entry i is the
+        distance from sentence i to sentence i + 1.
     """
-    distances = []
-    for i in range(len(sentences) - 1):
-        embedding_current = sentences[i]["combined_sentence_embedding"]
-        embedding_next = sentences[i + 1]["combined_sentence_embedding"]
-
-        # Calculate cosine similarity
-        similarity = cosine_similarity([embedding_current], [embedding_next])[0][0]
-
-        # Convert to cosine distance
-        distance = 1 - similarity
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if len(matrix) < 2:
+        return np.zeros(0, dtype=np.float32)
 
-        # Append cosine distance to the list
-        distances.append(distance)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    # Zero vectors get a similarity of 0, as with `cosine_similarity`.
+    norms[norms == 0] = 1.0
+    matrix /= norms
 
-        # Store distance in the dictionary
-        sentences[i]["distance_to_next"] = distance
-
-    # Optionally handle the last sentence
-    # sentences[-1]['distance_to_next'] = None  # or a default value
-
-    return distances, sentences
+    similarity = np.einsum("ij,ij->i", matrix[:-1], matrix[1:])
+    return 1.0 - similarity
 
 
 BreakpointThresholdType = Literal[
@@ -118,6 +115,8 @@ class SemanticChunker(BaseDocumentTransformer):
         number_of_chunks: Optional[int] = None,
         sentence_split_regex: str = r"(?<=[.?!])\s+",
         min_chunk_size: Optional[int] = None,
+        embedding_batch_size: int = 256,
+        max_concurrency: int = 4,
     ):
         self._add_start_index = add_start_index
         self.embeddings = embeddings
@@ -132,6 +131,8 @@ class SemanticChunker(BaseDocumentTransformer):
         else:
             self.breakpoint_threshold_amount = breakpoint_threshold_amount
         self.min_chunk_size = min_chunk_size
+        self.embedding_batch_size = embedding_batch_size
+        self.max_concurrency = max_concurrency
 
     def _calculate_breakpoint_threshold(
         self, distances: List[float]
@@ -192,40 +193,25 @@ class SemanticChunker(BaseDocumentTransformer):
         return cast(float, np.percentile(distances, y))
 
     def _calculate_sentence_distances(
-        self, single_sentences_list: List[str]
-    ) -> Tuple[List[float], List[dict]]:
-        """Split text into multiple components."""
-
-        _sentences = [
-            {"sentence": x, "index": i} for i, x in enumerate(single_sentences_list)
-        ]
-        sentences = combine_sentences(_sentences, self.buffer_size)
+        self, text: str, spans: np.ndarray
+    ) -> np.ndarray:
+        """Embed the sentence windows of `text` and return adjacent distances."""
         embeddings = self.embeddings.embed_documents(
-            [x["combined_sentence"] for x in sentences]
+            combine_sentences(text, spans, self.buffer_size)
         )
-        for i, sentence in enumerate(sentences):
-            sentence["combined_sentence_embedding"] = embeddings[i]
-
-        return calculate_cosine_distances(sentences)
-
-    def split_text(
-        self,
-        text: str,
-    ) -> List[str]:
-        # Splitting the essay (by default on '.', '?', and '!')
-        single_sentences_list = re.split(self.sentence_split_regex, text)
-
-        # having len(single_sentences_list) == 1 would cause the following
-        # np.percentile to fail.
-        if len(single_sentences_list) == 1:
-            return single_sentences_list
-        # similarly, the following np.gradient would fail
-        if (
-            self.breakpoint_threshold_type == "gradient"
-            and len(single_sentences_list) == 2
-        ):
-            return single_sentences_list
-        distances, sentences = self._calculate_sentence_distances(single_sentences_list)
+        return calculate_cosine_distances(embeddings)
+
+    def _needs_embeddings(self, spans: np.ndarray) -> bool:
+        # having a single sentence would cause the following np.percentile
+        # to fail, and two sentences would make np.gradient fail.
+        if len(spans) == 1:
+            return False
+        if self.breakpoint_threshold_type == "gradient" and len(spans) == 2:
+            return False
+        return True
+
+    def _chunk_spans(self, spans: np.ndarray, distances: np.ndarray) -> List[Tuple[int, int]]:
+        """Group sentences into chunks and return their character offsets."""
         if self.number_of_chunks is not None:
             breakpoint_distance_threshold = self._threshold_from_clusters(distances)
             breakpoint_array = distances
@@ -235,55 +221,103 @@ class SemanticChunker(BaseDocumentTransformer):
                 breakpoint_array,
             ) = self._calculate_breakpoint_threshold(distances)
 
-        indices_above_thresh = [
-            i
-            for i, x in enumerate(breakpoint_array)
-            if x > breakpoint_distance_threshold
-        ]
+        indices_above_thresh = np.flatnonzero(
+            np.asarray(breakpoint_array) > breakpoint_distance_threshold
+        ).tolist()
 
         chunks = []
         start_index = 0
 
         # Iterate through the breakpoints to slice the sentences
         for index in indices_above_thresh:
-            # The end index is the current breakpoint
-            end_index = index
-
-            # Slice the sentence_dicts from the current start index to the end index
-            group = sentences[start_index : end_index + 1]
-            combined_text = " ".join([d["sentence"] for d in group])
+            # The group runs from the current start sentence to the breakpoint
+            start, end = int(spans[start_index, 0]), int(spans[index, 1])
             # If specified, merge together small chunks.
             if (
                 self.min_chunk_size is not None
-                and len(combined_text) < self.min_chunk_size
+                and end - start < self.min_chunk_size
             ):
                 continue
-            chunks.append(combined_text)
+            chunks.append((start, end))
 
             # Update the start index for the next group
             start_index = index + 1
 
         # The last group, if any sentences remain
-        if start_index < len(sentences):
-            combined_text = " ".join([d["sentence"] for d in sentences[start_index:]])
-            chunks.append(combined_text)
+        if start_index < len(spans):
+            chunks.append((int(spans[start_index, 0]), int(spans[-1, 1])))
         return chunks
 
+    def _split_text_spans(self, text: str) -> List[Tuple[int, int]]:
+        # Splitting the essay (by default on '.', '?', and '!')
+        spans = sentence_spans(text, self.sentence_split_regex)
+        if len(spans) == 1:
+            return [(0, len(text))]
+        if not self._needs_embeddings(spans):
+            return [(int(start), int(end)) for start, end in spans]
+        distances = self._calculate_sentence_distances(text, spans)
+        return self._chunk_spans(spans, distances)
+
+    def split_text(
+        self,
+        text: str,
+    ) -> List[str]:
+        return [text[start:end] for start, end in self._split_text_spans(text)]
+
+    def _embed_batched(self, windows: List[str]) -> List[List[float]]:
+        """Embed windows in size-capped batches, several batches at a time."""
+        batches = [
+            windows[i : i + self.embedding_batch_size]
+            for i in range(0, len(windows), self.embedding_batch_size)
+        ]
+        if self.max_concurrency <= 1 or len(batches) <= 1:
+            results = [self.embeddings.embed_documents(batch) for batch in tqdm(batches)]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                results = list(
+                    tqdm(executor.map(self.embeddings.embed_documents, batches), total=len(batches))
+                )
+        return [embedding for batch in results for embedding in batch]
+
     def create_documents(
         self, texts: List[str], metadatas: Optional[List[dict]] = None
     ) -> List[Document]:
-        """Create documents from a list of texts."""
+        """Create documents from a list of texts.
+
+        Sentence windows from all texts are embedded together in batches of
+        `embedding_batch_size`, up to `max_concurrency` batches in flight,
+        and the results are scattered back to their texts. The output is
+        the same as calling `split_text` on each text in turn.
+        """
         _metadatas = metadatas or [{}] * len(texts)
+        all_spans = [sentence_spans(text, self.sentence_split_regex) for text in texts]
+
+        # Gather the windows of every text that needs embedding.
+        windows: List[str] = []
+        offsets = {}
+        for i, (text, spans) in enumerate(zip(texts, all_spans)):
+            if self._needs_embeddings(spans):
+                offsets[i] = len(windows)
+                windows.extend(combine_sentences(text, spans, self.buffer_size))
+        embeddings = self._embed_batched(windows) if windows else []
+
         documents = []
-        for i, text in tqdm(enumerate(texts), total=len(texts)):
-            start_index = 0
-            for chunk in self.split_text(text):
-                metadata = copy.deepcopy(_metadatas[i])
+        for i, (text, spans) in enumerate(zip(texts, all_spans)):
+            if len(spans) == 1:
+                chunk_spans = [(0, len(text))]
+            elif i in offsets:
+                start = offsets[i]
+                distances = calculate_cosine_distances(embeddings[start : start + len(spans)])
+                chunk_spans = self._chunk_spans(spans, distances)
+            else:
+                chunk_spans = [(int(start), int(end)) for start, end in spans]
+
+            for start, end in chunk_spans:
+                metadata = dict(_metadatas[i])
                 if self._add_start_index:
-                    metadata["start_index"] = start_index
-                new_doc = Document(page_content=chunk, metadata=metadata)
+                    metadata["start_index"] = start
+                new_doc = Document(page_content=text[start:end], metadata=metadata)
                 documents.append(new_doc)
-                start_index += len(chunk)
         return documents
 
     def split_documents(self, documents: Iterable[Document]) -> List[Document]:
@@ -0,0 +1,387 @@
+"""Quantized, memory-mapped vector store for small per-site corpora."""
+import json
+import os
+import threading
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+MAGIC = b"VISTAVI1"
+ALIGNMENT = 64
+
+
+def maximal_marginal_relevance(
+    query: np.ndarray, vectors: np.ndarray, k: int = 5, lambda_mult: float = 0.5
+) -> List[int]:
+    """Pick `k` rows of unit-length `vectors` trading relevance to `query` for diversity.
+
+    Returns:
+        Row indices in selection order.
+    """
+    if len(vectors) == 0 or k <= 0:
+        return []
+    relevance = vectors @ query
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything already selected.
+    redundancy = vectors @ vectors[selected[0]]
+    while len(selected) < min(k, len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return selected
+
+
+def kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means; returns unit-length centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(clusters):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids
+
+
+class QuantizedVectorStore(VectorStore):
+    """Vector store keeping all chunks of a collection in one file.
+
+    Vectors are normalized and stored as float16, or as int8 with one scale
+    per row, so similarity is cosine. The file is memory-mapped on open, so
+    loading costs a header read and the matrix is paged in on first search.
+    Search is exact over the whole matrix until the collection reaches
+    `ivf_min_size` chunks; larger collections get an inverted file of
+    k-means cells and only the `nprobe` closest cells are scanned. Changes
+    stay in memory until `persist` rewrites the file atomically, so a batch
+    of adds and deletes costs one write.
+
+    The store implements the parts of the Chroma interface the app uses
+    (`add_documents`, `delete`, `get`, `delete_collection` and the search
+    methods), so it can replace Chroma behind the retriever.
+
+    Args:
+        path: File holding the collection.
+        embedding_function: Model embedding texts and queries.
+        dtype: ``"int8"`` or ``"float16"``.
+        ivf_min_size: Chunks from which searches use the inverted file.
+        nprobe: Cells scanned per inverted file search.
+        block_size: Rows dequantized at a time by exact search.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedding_function: Embeddings,
+        dtype: str = "int8",
+        ivf_min_size: int = 4096,
+        nprobe: int = 8,
+        block_size: int = 4096,
+    ) -> None:
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Got unexpected dtype: {dtype}")
+        self.path = path
+        self.embedding_function = embedding_function
+        self.dtype = dtype
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.block_size = block_size
+        self._lock = threading.RLock()
+        self._clear()
+        if os.path.exists(path):
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _clear(self) -> None:
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._matrix = np.zeros((0, 0), dtype=self.dtype)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._centroids: Optional[np.ndarray] = None
+        self._cells = np.zeros(0, dtype=np.int32)
+        self._trained_size = 0
+        # Whether memory holds changes not written to the file yet.
+        self._dirty = False
+
+    # Storage
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+        scales = (np.abs(vectors).max(axis=1) / 127).astype(np.float32)
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+    def _vectors(self, rows=slice(None)) -> np.ndarray:
+        """Dequantize `rows` to unit-length float32 vectors."""
+        return self._matrix[rows].astype(np.float32) * self._scales[rows, None]
+
+    def _load(self) -> None:
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a vector index file")
+            header = json.loads(f.read(int.from_bytes(f.read(8), "little")))
+        self.dtype = header["dtype"]
+        self._ids = header["ids"]
+        self._texts = header["texts"]
+        self._metadatas = header["metadatas"]
+        self._trained_size = header["trained_size"]
+        arrays = {}
+        for name, (offset, dtype, shape) in header["arrays"].items():
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=tuple(shape))
+        self._matrix = arrays["matrix"]
+        self._scales = arrays["scales"]
+        self._cells = arrays["cells"]
+        self._centroids = arrays.get("centroids")
+
+    def _save(self) -> None:
+        arrays = {"matrix": self._matrix, "scales": self._scales, "cells": self._cells}
+        if self._centroids is not None:
+            arrays["centroids"] = self._centroids
+        # Materialize the arrays so nothing maps the file being replaced.
+        arrays = {name: np.array(array) for name, array in arrays.items()}
+        self._matrix, self._scales, self._cells = arrays["matrix"], arrays["scales"], arrays["cells"]
+        self._centroids = arrays.get("centroids")
+
+        header = {
+            "dtype": self.dtype,
+            "ids": self._ids,
+            "texts": self._texts,
+            "metadatas": self._metadatas,
+            "trained_size": self._trained_size,
+            "arrays": {},
+        }
+        # Offsets depend on the header length, which depends on the offsets;
+        # reserve room for them by sizing the header with placeholders first.
+        for name, array in arrays.items():
+            header["arrays"][name] = [10 ** 15, array.dtype.str, list(array.shape)]
+        offset = len(MAGIC) + 8 + len(json.dumps(header).encode("utf-8"))
+        for name, array in arrays.items():
+            offset += -offset % ALIGNMENT
+            header["arrays"][name][0] = offset
+            offset += array.nbytes
+        encoded = json.dumps(header).encode("utf-8")
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(encoded).to_bytes(8, "little"))
+            f.write(encoded)
+            for name, array in arrays.items():
+                f.write(b"\0" * (header["arrays"][name][0] - f.tell()))
+                f.write(array.tobytes())
+        os.replace(tmp, self.path)
+
+    # Inverted file
+
+    def _train(self) -> None:
+        vectors = self._vectors()
+        clusters = max(1, int(np.sqrt(len(vectors))))
+        sample = vectors[np.random.default_rng(0).permutation(len(vectors))[: clusters * 64]]
+        self._centroids = kmeans(sample, clusters)
+        self._cells = np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+        self._trained_size = len(vectors)
+
+    def _update_ivf(self, new_vectors: np.ndarray) -> None:
+        if len(self) < self.ivf_min_size or not len(self):
+            self._centroids = None
+            self._cells = np.zeros(0, dtype=np.int32)
+            self._trained_size = 0
+        elif self._centroids is None or len(self) > 2 * self._trained_size:
+            self._train()
+        else:
+            cells = np.argmax(new_vectors @ self._centroids.T, axis=1).astype(np.int32)
+            self._cells = np.concatenate([self._cells, cells])
+
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows in the cells closest to `query`, or None to scan everything."""
+        if self._centroids is None or len(self._cells) != len(self):
+            return None
+        probes = np.argsort(-(self._centroids @ query))[: self.nprobe]
+        return np.flatnonzero(np.isin(self._cells, probes))
+
+    # Vector store interface
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        embeddings = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas, ids)
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Add texts with precomputed embeddings; existing ids are replaced."""
+        ids = [i or uuid.uuid4().hex for i in ids] if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            existing = set(self._ids)
+            self.delete([i for i in ids if i in existing])
+            matrix, scales = self._quantize(vectors)
+            if len(self):
+                self._matrix = np.concatenate([self._matrix, matrix])
+                self._scales = np.concatenate([self._scales, scales])
+            else:
+                self._matrix, self._scales = matrix, scales
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._metadatas.extend(dict(m or {}) for m in metadatas)
+            self._update_ivf(self._vectors(slice(len(self) - len(ids), None)))
+            self._dirty = True
+        return ids
+
+    def persist(self) -> None:
+        """Write pending changes to the file."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+                self._dirty = False
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        if not ids:
+            return
+        with self._lock:
+            drop = set(ids)
+            keep = np.asarray([i not in drop for i in self._ids], dtype=bool)
+            if keep.all():
+                return
+            self._matrix = self._matrix[keep]
+            self._scales = self._scales[keep]
+            if len(self._cells) == len(keep):
+                self._cells = self._cells[keep]
+            self._ids = [i for i, k in zip(self._ids, keep) if k]
+            self._texts = [t for t, k in zip(self._texts, keep) if k]
+            self._metadatas = [m for m, k in zip(self._metadatas, keep) if k]
+            if len(self) < self.ivf_min_size:
+                self._update_ivf(np.zeros((0, 0), dtype=np.float32))
+            self._dirty = True
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None, **kwargs: Any) -> dict:
+        """Return stored chunks in Chroma's ``get`` layout."""
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            wanted = None if ids is None else set(ids)
+            rows = [r for r, i in enumerate(self._ids) if wanted is None or i in wanted]
+            result = {"ids": [self._ids[r] for r in rows]}
+            if "documents" in include:
+                result["documents"] = [self._texts[r] for r in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [dict(self._metadatas[r]) for r in rows]
+            if "embeddings" in include:
+                result["embeddings"] = self._vectors(list(rows))
+        return result
+
+    def delete_collection(self) -> None:
+        with self._lock:
+            self._clear()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _document(self, row: int) -> Document:
+        return Document(page_content=self._texts[row], metadata=dict(self._metadatas[row]), id=self._ids[row])
+
+    def _top(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and cosine scores of the `k` vectors closest to `query`."""
+        candidates = self._candidates(query)
+        if candidates is None:
+            scores = np.concatenate([
+                self._vectors(slice(start, start + self.block_size)) @ query
+                for start in range(0, len(self), self.block_size)
+            ])
+            rows = np.arange(len(self))
+        else:
+            scores = self._vectors(candidates) @ query
+            rows = candidates
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return rows[best], scores[best]
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embedding_function.embed_query(query), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) + 1e-12)
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        """Return the `k` closest chunks with their cosine similarity."""
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        with self._lock:
+            if not len(self):
+                return []
+            rows, scores = self._top(query, k)
+            return [(self._document(r), float(s)) for r, s in zip(rows, scores)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embed_query(query), k)
+
+    def max_marginal_relevance_search_by_vector(
+        self, embedding: List[float], k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any
+    ) -> List[Document]:
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        with self._lock:
+            if not len(self):
+                return []
+            rows, _ = self._top(query, fetch_k)
+            picked = maximal_marginal_relevance(query, self._vectors(rows), k, lambda_mult)
+            return [self._document(rows[p]) for p in picked]
+
+    def max_marginal_relevance_search(
+        self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(self._embed_query(query), k, fetch_k, lambda_mult)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        path: str = "vectordb/default.vidx",
+        **kwargs: Any,
+    ) -> "QuantizedVectorStore":
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        store.persist()
+        return store
@@ -3,96 +3,436 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
-from langchain.retrievers.multi_query import MultiQueryRetriever
+import chromadb
+import glob
 from lib.scraper import Scrape
+from lib.browser_pool import BrowserPool
+from lib.page_cache import PageCache
 from lib.text_splitter import SemanticChunker
+from lib.indexer import IncrementalIndexer
+from lib.pipeline import StreamingPipeline
+from lib.answer_cache import AnswerCache
+from lib.retrieval import Retriever
+from lib.context import dedupe_chunks, estimate_tokens, pack_context
+from lib.rerank import HybridReranker
+from lib.admission import AdmissionController, Busy
+from lib.embedding_cache import CachedEmbeddings
+from lib.namespaces import Namespace, NamespaceRegistry
+from lib.links import link_set_hash, match_urls, normalize_url, plan_urls
+from lib.vector_index import QuantizedVectorStore
 import torch
-import shutil
+import threading
+import time
 import os
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 app = Flask(__name__)
 
 
 class Chat:
-    def __init__(self) -> None:
+    """Answer questions about the pages a user browses.
+
+    Args:
+        model: Chat model writing the answers and the query rewrites;
+            Ollama's `model_name` if omitted.
+        embeddings: Embedding model; Ollama's `model_name` if omitted.
+    """
+
+    def __init__(self, model=None, embeddings=None) -> None:
         self.model_name = "llama3.2:3b"
-        self.model = ChatOllama(model = self.model_name)
-        self.embedding_function=OllamaEmbeddings(model = self.model_name)
-        self.multi_query_llm = ChatOllama(model = "llama3.2:3b")
+        self.model = model or ChatOllama(model = self.model_name)
+        # Shared by the chunker and the vector store so no text is embedded twice.
+        self.embedding_function = CachedEmbeddings(
+            embeddings or OllamaEmbeddings(model = self.model_name),
+            model_name=self.model_name,
+            path='embedding_cache.sqlite',
+        )
+        self.multi_query_llm = model or ChatOllama(model = "llama3.2:3b")
+        # "single", "multi" or "fast"; requests may override it.
+        self.retrieval = Retriever(self.multi_query_llm, strategy="fast")
+        # Estimated tokens of retrieved context put in the generation prompt.
+        self.context_budget = 1500
+        # Rescores the retrieved union; only the top N reach the prompt.
+        self.reranker = HybridReranker(self.embedding_function, time_budget=0.5)
+        self.rerank_top_n = 6
+        # Seconds a question waits for its page to finish indexing.
+        self.ingest_wait = 120
+        # Links scraped up front per link set; requests may override it.
+        self.crawl_budget = 20
+        # Deferred links queued per question; each batch invalidates the answer cache.
+        self.deferred_batch = 5
+        # Recent link sets per namespace whose pages stay indexed.
+        self.link_set_history = 4
+        # "chroma", or "quantized" for one memory-mapped int8 file per namespace.
+        self.vector_store = "chroma"
+        # Pages split concurrently; the semantic chunker embeds every sentence.
+        self.chunk_workers = 4
+
+        # Per-session collections, each with an open Chroma handle that is
+        # reloaded only when that namespace's index version changes.
+        self.namespaces = NamespaceRegistry(self.open_collection)
+
+        # Answers keyed by question and index version, reused until the index changes.
+        self.answer_cache = AnswerCache(self.embedding_function)
+
+        # Scraping state shared by every ingest, so the per-host limits and
+        # the HTTP connection pool hold across concurrent namespaces.
+        self.page_cache = PageCache()
+        self.browser = BrowserPool()
+        self.scraper = Scrape(cache=self.page_cache, browser=self.browser)
+
+
+    def open_collection(self, collection_name: str):
+        if self.vector_store == "quantized":
+            return QuantizedVectorStore(os.path.join('vectordb', f'{collection_name}.vidx'),
+                                        self.embedding_function)
+        return Chroma(collection_name=collection_name,
+                      persist_directory='vectordb', 
+                      embedding_function=self.embedding_function
+                      )
+
+
+    def warm_up(self) -> None:
+        """Register collections left on disk, then prime the models and the browser.
+
+        Each step fails on its own, so a missing browser or a down Ollama
+        never keeps existing collections out of the namespace budget.
+        """
+        print("Warming up models..")
+        try:
+            if self.vector_store == "quantized":
+                self.namespaces.adopt(os.path.basename(path)[:-len('.vidx')]
+                                      for path in glob.glob(os.path.join('vectordb', '*.vidx')))
+            elif os.path.exists('vectordb'):
+                client = chromadb.PersistentClient(path='vectordb')
+                self.namespaces.adopt(c.name for c in client.list_collections())
+            self.namespaces.evict()
+        except Exception as e:
+            print(f"Adopting collections failed: {e}")
+        try:
+            self.model.invoke("Hello")
+            self.embedding_function.embed_query("Hello")
+            print("Models are warm.")
+        except Exception as e:
+            print(f"Warming up the models failed: {e}")
+        try:
+            self.browser.start()
+        except Exception as e:
+            print(f"Starting the browser failed: {e}")
+
+
+    def create_db(self, urls: list, namespace: str = 'default',
+                  rebuild: bool = False, prune: bool = True) -> None:
+        ns = self.namespaces.get(namespace)
+        generation = ns.generation
+        with ns.ingest_lock:
+            self._create_db(urls, ns, generation, rebuild=rebuild, prune=prune)
+        self.namespaces.evict()
+
+
+    def ingest(self, urls: list, namespace: str = 'default', current_url: str = '',
+               budget: int = None, link_set: str = None) -> None:
+        """Start indexing a page's link set in the background, current page first.
+
+        Only the `budget` most promising links (see `lib.links.plan_urls`)
+        are planned now; the rest are deferred until questions ask for them.
+        The namespace keeps the pages of its last `link_set_history` link
+        sets (identified by `lib.links.link_set_hash`), so only planned links
+        not indexed yet are scraped, and returning to a recent link set
+        needs no scraping at all. Does nothing if the same link set is being
+        or has been indexed, so repeated reports of a page are cheap.
+        """
+        ns = self.namespaces.get(namespace)
+        link_set = link_set or link_set_hash(urls, current_url)
+        head, tail = plan_urls(urls, current_url, budget=budget or self.crawl_budget)
+        with ns.lock:
+            if ns.link_set == link_set and (ns.worker is not None or ns.complete):
+                return
+            if ns.link_set != link_set:
+                # Supersedes the ingest of the previous link set.
+                ns.link_set = link_set
+                ns.current_url = normalize_url(current_url) if current_url else ''
+                ns.generation += 1
+                ns.complete = False
+            ns.link_sets[link_set] = set(head)
+            ns.link_sets.move_to_end(link_set)
+            while len(ns.link_sets) > self.link_set_history:
+                ns.link_sets.popitem(last=False)
+            ns.deferred_urls = tail
+            todo = [url for url in head if url not in ns.ready_urls]
+        print(f"Crawl plan for namespace {ns.name}: {len(todo)} of {len(head)} links to index, "
+              f"{len(tail)} deferred.")
+        # Also prunes pages that left every recent link set.
+        self.index_in_background(todo, namespace=namespace)
+
+
+    def index_deferred(self, question: str, namespace: str = 'default') -> None:
+        """Queue the deferred links that mention terms of `question` for background indexing.
+
+        At most `deferred_batch` links are queued per question, and none if
+        no deferred link matches, since every batch bumps the index version.
+        """
+        ns = self.namespaces.get(namespace)
+        with ns.lock:
+            batch, ns.deferred_urls = match_urls(
+                ns.deferred_urls, question, limit=self.deferred_batch)
+            if not batch:
+                return
+            if ns.link_set in ns.link_sets:
+                ns.link_sets[ns.link_set] |= set(batch)
+        print(f"Indexing {len(batch)} deferred links, {len(ns.deferred_urls)} left.")
+        self.index_in_background(batch, namespace=namespace, prune=False)
+
+
+    def wait_until_indexed(self, url: str, namespace: str = 'default') -> bool:
+        """Block until `url` is queryable or indexing stops; return whether it is ready."""
+        ns = self.namespaces.get(namespace)
+        with ns.lock:
+            return ns.indexed.wait_for(
+                lambda: url in ns.ready_urls or ns.worker is None, timeout=self.ingest_wait
+            ) and url in ns.ready_urls
+
+
+    def ingest_status(self, namespace: str = 'default') -> dict:
+        """Progress of the namespace's link set."""
+        ns = self.namespaces.get(namespace)
+        with ns.lock:
+            current_url = ns.current_url
+            return {
+                'namespace': ns.name,
+                'link_set': ns.link_set,
+                'state': 'indexing' if ns.worker is not None else 'idle',
+                'complete': ns.complete,
+                'current_url': current_url,
+                'current_ready': bool(current_url) and current_url in ns.ready_urls,
+                'ready': len(ns.ready_urls),
+                'deferred': len(ns.deferred_urls),
+                'chunks': ns.chunks,
+                'version': ns.version,
+            }
+
+
+    def index_in_background(self, urls: list, namespace: str = 'default', prune: bool = True) -> None:
+        """Index `urls` in a background worker; queries keep using the index meanwhile.
+
+        With `prune=False` the links are added to any pending batch instead
+        of replacing it.
+        """
+        ns = self.namespaces.get(namespace)
+        with ns.lock:
+            if not prune and ns.pending_urls is not None:
+                pending, pending_prune = ns.pending_urls
+                ns.pending_urls = (pending + [url for url in urls if url not in pending], pending_prune)
+            else:
+                ns.pending_urls = (urls, prune)
+            if ns.worker is not None and ns.worker.is_alive():
+                return
+            ns.worker = threading.Thread(target=self._background_worker, args=(ns,), daemon=True)
+            ns.worker.start()
+
+
+    def _background_worker(self, ns: Namespace) -> None:
+        while True:
+            with ns.lock:
+                pending, ns.pending_urls = ns.pending_urls, None
+                if pending is None:
+                    ns.worker = None
+                    ns.indexed.notify_all()
+                    return
+            urls, prune = pending
+            try:
+                self.create_db(urls, namespace=ns.name, prune=prune)
+            except Exception as e:
+                print(e)
 
 
-    def create_db(self, urls: list) -> None:
-        if os.path.exists('vectordb'):
-            shutil.rmtree('vectordb')
-        print("Scrapping..")
-        Tool = Scrape()
-        docs = Tool.scrape(urls)
+    def _create_db(self, urls: list, ns: Namespace, generation: int,
+                   rebuild: bool = False, prune: bool = True) -> None:
+        """Bring the namespace's index in line with `urls`.
+
+        By default only new or changed pages are chunked and embedded, and
+        pages that left the link set are deleted. `rebuild=True` drops the
+        collection and re-embeds everything; `prune=False` only adds pages.
+        The ingest stops early if a newer link set bumps `ns.generation`.
+        """
+        if rebuild:
+            with ns.lock:
+                self.namespaces.drop(ns)
+        print(f"Scrapping for namespace {ns.name}..")
 
         try:
-            if docs:
-                chunker = SemanticChunker(
-                    embeddings=self.embedding_function, 
-                    breakpoint_threshold_type="percentile")
-                
-                chunks = chunker.split_documents(docs)
-
-                vectordb = Chroma.from_documents(
-                    documents=chunks,
-                    embedding=self.embedding_function,
-                    persist_directory='vectordb',
-                )
-                print("Vector database is created.")
+            vectordb = self.namespaces.vectordb(ns)
+            indexer = IncrementalIndexer(vectordb)
+            indexed = indexer.indexed()
+            chunker = SemanticChunker(
+                embeddings=self.embedding_function, 
+                breakpoint_threshold_type="percentile",
+                add_start_index=True)
+            changed = []
+
+            def clean(doc):
+                needs_index, old_ids = indexer.check(doc, indexed)
+                if not needs_index:
+                    # Rebuilds block ownership for pages indexed before a restart.
+                    ns.deduplicator.claim(doc.metadata["source"], doc.page_content.split("\n"))
+                    with ns.lock:
+                        ns.ready_urls.add(doc.metadata["source"])
+                        ns.indexed.notify_all()
+                    return
+                # The old version's blocks go with its chunks.
+                ns.deduplicator.forget(doc.metadata["source"])
+                # Drop menus, footers and paragraphs already indexed from other pages.
+                blocks = ns.deduplicator.filter(
+                    doc.metadata["source"], doc.page_content.split("\n"))
+                doc.page_content = "\n".join(blocks)
+                yield doc, old_ids
+
+            def chunk(item):
+                doc, old_ids = item
+                chunks = chunker.split_documents([doc]) if doc.page_content else []
+                yield doc.metadata["source"], chunks, old_ids
+
+            def embed(item):
+                # Fills the embedding cache so indexing doesn't call the model.
+                _, chunks, _ = item
+                self.embedding_function.embed_documents([c.page_content for c in chunks])
+                yield item
+
+            def index(item):
+                url, chunks, old_ids = item
+                indexer.delete(old_ids)
+                indexer.add(chunks)
+                changed.append(len(chunks))
+                # Each page is queryable as soon as it is added.
+                with ns.lock:
+                    if ns.keywords.loaded:
+                        ns.keywords.remove_url(url)
+                        ns.keywords.add(chunks)
+                    ns.ready_urls.add(url)
+                    ns.indexed.notify_all()
+                    ns.version += 1
+                    ns.loaded_version = ns.version
+                return ()
+
+            def pages():
+                for doc in self.scraper.scrape_iter(urls):
+                    if ns.generation != generation:
+                        print(f"Indexing for namespace {ns.name} superseded.")
+                        return
+                    yield doc
+
+            pipeline = StreamingPipeline(
+                pages(),
+                [("clean", clean), ("chunk", chunk, self.chunk_workers),
+                 ("embed", embed), ("index", index)],
+                queue_size=4,
+                source_name="scrape",
+            )
+            for metrics in pipeline.run():
+                print(metrics)
+
+            cancelled = ns.generation != generation
+            with ns.lock:
+                # Pages that failed to fetch keep their old chunks and are
+                # retried when the link set is reported again.
+                fetched = set(urls) <= ns.ready_urls
+            if prune and not cancelled and fetched:
+                ns.complete = True
+            with ns.lock:
+                # Pages of the namespace's recent link sets are kept.
+                wanted = set(urls).union(*ns.link_sets.values())
+            stale_ids = indexer.stale(indexed, wanted) if prune and not cancelled else []
+            indexer.delete(stale_ids)
+            if stale_ids:
+                with ns.lock:
+                    for url in set(indexed) - wanted:
+                        ns.deduplicator.forget(url)
+                        if ns.keywords.loaded:
+                            ns.keywords.remove_url(url)
+            if prune and not cancelled:
+                with ns.lock:
+                    ns.ready_urls &= wanted
+            # One write for the whole ingest on stores that batch changes.
+            self.namespaces.persist(ns)
+            print(f"{len(changed)} new or changed pages, {len(stale_ids)} stale chunks.")
+            if not changed and not stale_ids:
+                print("Vector database is up to date.")
+                return
+
+            ns.chunks = len(vectordb.get(include=[])["ids"])
+            print(f"Embedding cache: {self.embedding_function.stats()}")
+            print(f"Deduplication: {ns.deduplicator.stats()}")
+            with ns.lock:
+                ns.version += 1
+                ns.loaded_version = ns.version
+            print("Vector database is updated.")
         except Exception as e:
             print(e)
             raise ValueError
 
 
-    def retriever(self, question: str):
-        QUERY_PROMPT = PromptTemplate(
-            input_variables=["question"],
-            template="""You are an AI language model assistant. Your task is to generate five 
-            different versions of the given user question to retrieve relevant documents from a vector 
-            database. By generating multiple perspectives on the user question, your goal is to help
-            the user overcome some of the limitations of the distance-based similarity search. 
-            Provide these alternative questions separated by newlines.
-            Original question: {question}""",
-        )
+    def retriever(self, question: str, namespace: str = 'default', strategy: str = None):
         print("Retriving from vector database..")
-        vectordb = Chroma(persist_directory='vectordb', 
-                      embedding_function=self.embedding_function
-                      )
-
-        retriever_from_llm = MultiQueryRetriever.from_llm(
-            retriever=vectordb.as_retriever(
-                search_type="mmr",
-                search_kwargs={'k': 5, 'fetch_k': 20}
-            ), 
-            llm=self.multi_query_llm,
-        )
-
-        docs = retriever_from_llm.invoke(question)
+        ns = self.namespaces.get(namespace)
+        with ns.lock:
+            vectordb = self.namespaces.vectordb(ns)
+            keywords = self.namespaces.keywords(ns)
+        # Searched outside the lock, so indexing and other questions are not
+        # held up by the query rewrites.
+        docs = self.retrieval.retrieve(vectordb, question, strategy=strategy, keywords=keywords)
         print("Retrieval completed.")
         return docs
 
 
-    def generate(self, question: str, urls: list, token: str):
-        print(f"Incoming token: {token}")
+    def generate(self, question: str, urls: list, namespace: str = 'default',
+                 current_url: str = '', link_set: str = None, strategy: str = None,
+                 crawl_budget: int = None):
+        return "".join(self.generate_stream(
+            question, urls, namespace=namespace, current_url=current_url,
+            link_set=link_set, strategy=strategy, crawl_budget=crawl_budget))
+
+
+    def generate_stream(self, question: str, urls: list, namespace: str = 'default',
+                        current_url: str = '', link_set: str = None, strategy: str = None,
+                        crawl_budget: int = None):
+        """Yield the answer to `question` token by token as the model writes it.
+
+        `link_set` identifies the page's links (see `lib.links.link_set_hash`);
+        a known link set is answered from its index without re-ingesting.
+        """
+        link_set = link_set or link_set_hash(urls, current_url)
+        print(f"Incoming link set: {link_set[:16]}, namespace: {namespace}")
         torch.cuda.empty_cache()
-        context = []
-        if token == '0':
-            self.create_db(urls)
-        else:
-            print("Using persisted embeddings.")
+        if urls or current_url:
+            # Usually already started by /ingest when the page loaded; answer
+            # as soon as the first page is in, the rest follows behind it.
+            self.ingest(urls, namespace=namespace, current_url=current_url,
+                        budget=crawl_budget, link_set=link_set)
+            first, _ = plan_urls(urls, current_url, budget=1)
+            if first and not self.wait_until_indexed(first[0], namespace=namespace):
+                print(f"{first[0]} is not indexed; answering from what is.")
+            # Deferred links matching the question are indexed for the next questions.
+            self.index_deferred(question, namespace=namespace)
 
-        docs = self.retriever(question=question)
+        version = self.namespaces.get(namespace).version
+        cached = self.answer_cache.get(namespace, version, self.model_name, question)
+        print(f"Answer cache: {self.answer_cache.stats()}")
+        if cached is not None:
+            print("Answer served from cache.")
+            yield cached
+            return
 
-        print("Retrieval Successfull")
+        docs = self.retriever(question=question, namespace=namespace, strategy=strategy)
 
-        for doc in docs:
-            context.append(doc.page_content)
+        print("Retrieval Successfull")
 
-        context = "\n\n".join(context)
+        # Rank every candidate and drop repeats before taking the top N, so
+        # chunks found by several queries don't take more than one slot.
+        docs = self.reranker.rerank(question, docs, top_n=len(docs))
+        docs = dedupe_chunks(docs)[:self.rerank_top_n]
+        context, packing = pack_context(
+            docs, budget_tokens=self.context_budget, score_key="rerank_score")
+        print(f"Context packing: {packing}")
 
         prompt = PromptTemplate.from_template(
             """You are an expert on giving information of a website based on the context.
@@ -107,8 +447,32 @@ class Chat:
         )
 
         chain = prompt | self.model | StrOutputParser()
-        response = chain.invoke({"context": context, "question": question})
-        return response
+        prompt_tokens = estimate_tokens(prompt.format(context=context, question=question))
+        response = []
+        start = time.perf_counter()
+        for piece in chain.stream({"context": context, "question": question}):
+            if not response:
+                # Time to first token is dominated by prompt prefill.
+                print(f"Prompt ~{prompt_tokens} tokens, prefill {time.perf_counter() - start:.2f}s")
+            response.append(piece)
+            yield piece
+        self.answer_cache.put(namespace, version, self.model_name, question, "".join(response))
+
+
+# Long-lived engine shared by every request; warmed up when the server starts.
+Tool = Chat()
+
+
+# Bounds how many requests run at once and how many may queue for a slot.
+admission = AdmissionController(max_active=4, max_waiting=16, wait_timeout=120)
+
+
+def busy_response(error: Busy):
+    print(f"Request rejected: {error}")
+    response = jsonify({'status': 'busy', 'message': f"Server is busy: {error}"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
 
 
 @app.route('/generate', methods=['POST'])
@@ -118,15 +482,79 @@ def main():
     else:
         json_data = None
 
-    Tool = Chat()
-    response = Tool.generate(
-        question=json_data['command'],
-        urls=json_data['urls'],
-        token=json_data['token']
-    )
+    try:
+        with admission.admit():
+            response = Tool.generate(
+                question=json_data['command'],
+                urls=json_data['urls'],
+                namespace=json_data.get('namespace', 'default'),
+                current_url=json_data.get('current_url', ''),
+                link_set=json_data.get('link_set'),
+                strategy=json_data.get('strategy'),
+                crawl_budget=json_data.get('crawl_budget'),
+            )
+    except Busy as e:
+        return busy_response(e)
     return jsonify({
         'response': response,
     })
 
+@app.route('/generate-stream', methods=['POST'])
+def generate_stream():
+    """Stream the answer as chunked plain text while it is generated."""
+    json_data = request.get_json()
+    try:
+        started = admission.enter()
+    except Busy as e:
+        return busy_response(e)
+
+    def tokens():
+        # The slot is held until the last token has been sent.
+        try:
+            yield from Tool.generate_stream(
+                question=json_data['command'],
+                urls=json_data['urls'],
+                namespace=json_data.get('namespace', 'default'),
+                current_url=json_data.get('current_url', ''),
+                link_set=json_data.get('link_set'),
+                strategy=json_data.get('strategy'),
+                crawl_budget=json_data.get('crawl_budget'),
+            )
+        finally:
+            admission.leave(started)
+
+    return Response(stream_with_context(tokens()), mimetype='text/plain')
+
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    """Start indexing a page's links in the background and return right away."""
+    json_data = request.get_json()
+    urls = json_data.get('urls', [])
+    current_url = json_data.get('current_url', '')
+    namespace = json_data.get('namespace', 'default')
+    Tool.ingest(urls=urls, namespace=namespace, current_url=current_url,
+                budget=json_data.get('crawl_budget'), link_set=json_data.get('link_set'))
+    return jsonify(Tool.ingest_status(namespace)), 202
+
+@app.route('/ingest-status', methods=['GET'])
+def ingest_status():
+    """Indexing progress of a namespace's current link set."""
+    return jsonify(Tool.ingest_status(request.args.get('namespace', 'default')))
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Admission queue depth and request latency percentiles."""
+    return jsonify({
+        'admission': admission.stats(),
+    })
+
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=50001, debug=True)
\ No newline at end of file
+    Tool.warm_up()
+    try:
+        from waitress import serve
+    except ImportError:
+        print("waitress is not installed; falling back to Flask's threaded server.")
+        app.run(host="0.0.0.0", port=50001, threaded=True, use_reloader=False)
+    else:
+        # Threads beyond the admission limit only wait in the admission queue.
+        serve(app, host="0.0.0.0", port=50001, threads=admission.max_active + admission.max_waiting)
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""Tests of the answer cache tiers."""
+import unittest
+
+from langchain_core.embeddings import Embeddings
+
+from lib.answer_cache import AnswerCache
+
+
+class SameEmbedding(Embeddings):
+    """Embeds every text to the same vector, like near-identical questions."""
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+class AnswerCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = AnswerCache(SameEmbedding())
+        self.cache.put("ns", 1, "model", "What is the price of the basic plan?", "Ten dollars.")
+
+    def test_exact_hit_ignores_case_and_punctuation(self):
+        self.assertEqual(self.cache.get("ns", 1, "model", "what is the price of the basic plan"),
+                         "Ten dollars.")
+        self.assertEqual(self.cache.stats()["exact_hits"], 1)
+
+    def test_semantic_hit_needs_the_same_content_words(self):
+        self.assertEqual(self.cache.get("ns", 1, "model", "Tell me the basic plan price"),
+                         "Ten dollars.")
+        self.assertEqual(self.cache.stats()["semantic_hits"], 1)
+
+    def test_question_about_another_name_or_number_misses(self):
+        self.assertIsNone(self.cache.get("ns", 1, "model", "What is the price of the pro plan?"))
+        self.cache.put("ns", 1, "model", "Is there a plan for 5 users?", "Yes.")
+        self.assertIsNone(self.cache.get("ns", 1, "model", "Is there a plan for 50 users?"))
+        self.assertEqual(self.cache.stats()["semantic_hits"], 0)
+
+    def test_new_index_version_drops_the_namespace_answers(self):
+        self.assertIsNone(self.cache.get("ns", 2, "model", "What is the price of the basic plan?"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Tests of answer streaming with a fake chat model and fake embeddings."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+ANSWER = "The basic plan costs ten dollars a month. It includes email support."
+
+
+class GenerateStreamTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Caches and collections are created relative to the working directory.
+        cls.cwd = os.getcwd()
+        cls.workdir = tempfile.mkdtemp()
+        os.chdir(cls.workdir)
+        import main
+
+        cls.main = main
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+
+    def setUp(self):
+        model = GenericFakeChatModel(messages=iter([AIMessage(content=ANSWER)] * 4))
+        self.chat = self.main.Chat(model=model, embeddings=DeterministicFakeEmbedding(size=32))
+        self.chat.vector_store = "quantized"
+        ns = self.chat.namespaces.get("test")
+        self.chat.namespaces.vectordb(ns).add_texts(
+            ["The basic plan costs $10 per month.", "The pro plan costs $25 per month."],
+            metadatas=[{"source": "https://example.com/pricing"}] * 2,
+        )
+
+    def test_answer_is_streamed_in_pieces(self):
+        pieces = list(self.chat.generate_stream("How much is the basic plan?", [],
+                                                namespace="test", strategy="single"))
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual("".join(pieces), ANSWER)
+
+    def test_repeated_question_is_served_from_the_answer_cache(self):
+        question = "How much is the basic plan?"
+        "".join(self.chat.generate_stream(question, [], namespace="test", strategy="single"))
+        self.assertEqual(
+            list(self.chat.generate_stream(question, [], namespace="test", strategy="single")),
+            [ANSWER],
+        )
+
+    def test_generate_stream_route(self):
+        self.main.Tool = self.chat
+        client = self.main.app.test_client()
+        response = client.post("/generate-stream", json={
+            "command": "How much is the basic plan?",
+            "urls": [],
+            "namespace": "test",
+            "strategy": "single",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/plain")
+        self.assertEqual(response.get_data(as_text=True), ANSWER)
+        self.assertEqual(self.main.admission.stats()["active"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
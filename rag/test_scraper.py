@@ -0,0 +1,184 @@
+"""Tests of the page cache and the scraper against a stub site served with http.server."""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lib.page_cache import PageCache
+from lib.scraper import Scrape
+
+LONG_TEXT = "This paragraph describes the product in enough detail to be indexed. " * 10
+LONG_PAGE = f"<html><body><p>{LONG_TEXT}</p></body></html>"
+SHORT_TEXT = "Our opening hours are nine to five on weekdays, closed on weekends."
+SHORT_PAGE = f"<html><body><p>{SHORT_TEXT}</p><div id='app'></div></body></html>"
+RENDERED_PAGE = f"<html><body><p>Rendered. {LONG_TEXT}</p></body></html>"
+ETAG = '"v1"'
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+class StubSite(ThreadingHTTPServer):
+    """Serve a few pages, recording the conditional headers of every request."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests = []
+
+    def url(self, path):
+        host, port = self.server_address
+        return f"http://{host}:{port}{path}"
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up before the stub answers.
+        pass
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(
+            (self.path, self.headers.get("If-None-Match"), self.headers.get("If-Modified-Since")))
+        if self.path == "/slow":
+            time.sleep(1)
+        if self.path == "/etag" and self.headers.get("If-None-Match") == ETAG:
+            return self._send(304, b"")
+        if self.path == "/modified" and self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+            return self._send(304, b"")
+        page = SHORT_PAGE if self.path == "/short" else LONG_PAGE
+        headers = {"ETag": ETAG} if self.path == "/etag" else {}
+        if self.path == "/modified":
+            headers["Last-Modified"] = LAST_MODIFIED
+        self._send(200, page.encode("utf-8"), headers)
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeBrowser:
+    """Stands in for `BrowserPool`, optionally failing every render."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.rendered = []
+
+    def render(self, url, timeout=15.0):
+        self.rendered.append(url)
+        if self.fail:
+            raise TimeoutError(f"rendering {url} timed out")
+        return RENDERED_PAGE
+
+
+class PageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_entry_is_fresh_for_its_ttl(self):
+        cache = PageCache(self.path, ttl=60)
+        entry = cache.put("https://example.com", "<html></html>", etag=ETAG)
+        self.assertTrue(cache.is_fresh(cache.get("https://example.com")))
+        entry["fetched_at"] -= 61
+        self.assertFalse(cache.is_fresh(entry))
+
+    def test_validators_come_from_the_entry(self):
+        cache = PageCache(self.path)
+        entry = cache.put("https://example.com", "<html></html>", ETAG, LAST_MODIFIED)
+        self.assertEqual(cache.validators(entry),
+                         {"If-None-Match": ETAG, "If-Modified-Since": LAST_MODIFIED})
+        self.assertEqual(cache.validators(None), {})
+
+    def test_least_recently_used_entries_are_evicted_over_the_size_bound(self):
+        cache = PageCache(self.path, max_bytes=20_000)
+        for i in range(20):
+            cache.put(f"https://example.com/{i}", "x" * 2000)
+            # Keep the first page in use so it outlives the others.
+            cache.get("https://example.com/0")
+            time.sleep(0.01)
+        size = sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+        self.assertLessEqual(size, 20_000)
+        self.assertIsNotNone(cache.get("https://example.com/0"))
+        self.assertIsNotNone(cache.get("https://example.com/19"))
+        self.assertIsNone(cache.get("https://example.com/1"))
+        # A reopened cache starts from the size on disk.
+        self.assertEqual(PageCache(self.path, max_bytes=20_000)._size, size)
+
+
+class ScrapeTest(unittest.TestCase):
+    def setUp(self):
+        self.site = StubSite()
+        threading.Thread(target=self.site.serve_forever, daemon=True).start()
+        self.path = tempfile.mkdtemp()
+        self.browser = FakeBrowser()
+
+    def tearDown(self):
+        self.site.shutdown()
+        self.site.server_close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def scraper(self, ttl=600, timeout=5.0, browser=None):
+        return Scrape(cache=PageCache(self.path, ttl=ttl), timeout=timeout,
+                      browser=browser or self.browser)
+
+    def test_long_static_page_is_not_rendered(self):
+        doc = self.scraper().fetch(self.site.url("/long"))
+        self.assertIn("enough detail", doc.page_content)
+        self.assertEqual(self.browser.rendered, [])
+
+    def test_short_static_page_is_rendered(self):
+        doc = self.scraper().fetch(self.site.url("/short"))
+        self.assertIn("Rendered.", doc.page_content)
+        self.assertEqual(self.browser.rendered, [self.site.url("/short")])
+
+    def test_short_static_page_is_kept_when_the_render_fails(self):
+        doc = self.scraper(browser=FakeBrowser(fail=True)).fetch(self.site.url("/short"))
+        self.assertEqual(doc.page_content, SHORT_TEXT)
+
+    def test_fresh_entry_is_served_without_a_request(self):
+        scraper = self.scraper(ttl=600)
+        scraper.fetch(self.site.url("/long"))
+        doc = scraper.fetch(self.site.url("/long"))
+        self.assertIn("enough detail", doc.page_content)
+        self.assertEqual(len(self.site.requests), 1)
+
+    def test_stale_entry_is_revalidated_with_its_etag(self):
+        scraper = self.scraper(ttl=0)
+        scraper.fetch(self.site.url("/etag"))
+        doc = scraper.fetch(self.site.url("/etag"))
+        self.assertIn("enough detail", doc.page_content)
+        self.assertEqual(self.site.requests[-1], ("/etag", ETAG, None))
+
+    def test_stale_entry_is_revalidated_with_its_last_modified_date(self):
+        scraper = self.scraper(ttl=0)
+        scraper.fetch(self.site.url("/modified"))
+        doc = scraper.fetch(self.site.url("/modified"))
+        self.assertIn("enough detail", doc.page_content)
+        self.assertEqual(self.site.requests[-1], ("/modified", None, LAST_MODIFIED))
+
+    def test_slow_page_times_out_and_falls_back_to_a_render(self):
+        start = time.perf_counter()
+        doc = self.scraper(timeout=0.2).fetch(self.site.url("/slow"))
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertIn("Rendered.", doc.page_content)
+
+    def test_page_that_cannot_be_fetched_is_skipped(self):
+        scraper = self.scraper(timeout=0.2, browser=FakeBrowser(fail=True))
+        self.assertIsNone(scraper.fetch(self.site.url("/slow")))
+        docs = scraper.scrape([self.site.url("/slow"), self.site.url("/long")])
+        self.assertEqual([doc.metadata["source"] for doc in docs], [self.site.url("/long")])
+
+
+if __name__ == "__main__":
+    unittest.main()